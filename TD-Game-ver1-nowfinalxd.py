@@ -1,18 +1,56 @@
+import time
+STARTUP_T0 = time.perf_counter() # before pygame loads, for the startup report
 import pygame
 import sys
+import os
 import math
+import copy
+import json
+import hashlib
 import random
+import heapq
+import warnings
+import threading
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
 from enum import Enum
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # --- CONFIGURATION & CONSTANTS ---
 SCREEN_WIDTH = 1280 
 SCREEN_HEIGHT = 720
 FPS = 60
 
+# Simulation runs at a fixed 60 ticks/sec regardless of render speed
+SIM_TICK_MS = 1000 / 60
+GAME_SPEEDS = [1, 2, 4, 16]
+MAX_CATCHUP_FRAMES = 4 # at most this many frames' worth of ticks per render
+
+# Rendering runs at the display's refresh rate (or --fps), drawing entities
+# interpolated between the last two ticks. With vsync, flip() waits for the
+# display and the cap only bounds it; without, frames are paced to FPS.
+RENDER_FPS_CAP = 240 # highest render rate accepted
+INTERP_MAX_JUMP = 40 # logical px; bigger moves (pooled projectile reuse) snap
+
+# Frame pacing when nothing needs drawing
+IDLE_WAIT_MS = 500 # longest sleep between checks while idle
+HIDDEN_FPS = 10 # loop rate while minimized; the sim keeps running
+HIDDEN_CATCHUP_FRAMES = MAX_CATCHUP_FRAMES * FPS // HIDDEN_FPS
+
 # LOGICAL SCREEN (Game Balance coords)
 LOGICAL_WIDTH = 600
 LOGICAL_HEIGHT = 400
 
+LEVELS_PER_PAGE = 3 # level select cards per page
+
 # Colors
 COLOR_BLACK = (0, 0, 0) 
 COLOR_WHITE = (255, 255, 255) 
@@ -34,6 +72,12 @@ class TowerType(Enum):
     SAP = 'SAP'
     ROCK = 'ROCK'
 
+class TargetPolicy(Enum):
+    FIRST = 'FIRST' # furthest along the path
+    LAST = 'LAST'
+    STRONGEST = 'STRONGEST'
+    CLOSEST = 'CLOSEST'
+
 class EnemyType(Enum):
     NORMAL = 'NORMAL'
     FAST = 'FAST'
@@ -209,6 +253,15 @@ TOWER_STATS = {
 
 UPGRADE_COST_MULTIPLIER = 1.5
 
+ENEMY_BOUNTY = {
+    EnemyType.NORMAL: 5,
+    EnemyType.FAST: 5,
+    EnemyType.TANK: 10,
+    EnemyType.SPRINTER: 5,
+    EnemyType.JUGGERNAUT: 20,
+    EnemyType.SHAMAN: 25,
+}
+
 TOWER_PASSIVES = {
     TowerType.ARCHER: [
         {'id': 'MULTI_SHOT', 'name': 'Multi-Shot', 'desc': 'Fires 2 arrows', 'cost': 150},
@@ -228,100 +281,266 @@ TOWER_PASSIVES = {
 }
 
 # --- WAVE GENERATION SYSTEM ---
-def generate_waves_for_level(difficulty_multiplier):
-    waves = []
-    total_waves = 15
-    
-    for i in range(total_waves):
-        wave_num = i + 1
-        
-        # Determine enemy type
-        if wave_num % 15 == 0:
-            e_type = EnemyType.JUGGERNAUT
-            count = 2 + int(difficulty_multiplier)
-        elif wave_num % 5 == 0:
-            e_type = EnemyType.TANK
-            count = 3 + int(wave_num / 3)
-        elif wave_num % 4 == 0:
-            e_type = EnemyType.SHAMAN
-            count = 4 + int(wave_num / 2)
-        elif wave_num % 3 == 0:
-            e_type = EnemyType.SPRINTER
-            count = 8 + wave_num
-        elif wave_num % 2 == 0:
-            e_type = EnemyType.FAST
-            count = 10 + wave_num
-        else:
-            e_type = EnemyType.NORMAL
-            count = 10 + (wave_num * 2)
-
-        count = int(count * difficulty_multiplier)
-        interval = max(5, 60 - (wave_num * 3))
-        
-        waves.append({
-            'enemyType': e_type,
-            'count': count,
-            'interval': interval,
-            'delay': 0
-        })
-        
-    return waves
-
-# Level Data
-LEVELS = [
-    {
-        'id': 1, 'name': "The Outskirts", 'startGold': 250, 'startLives': 10,
-        'path': [
-            (0, 50), (100, 50),
-            (100, 200), (300, 200),
-            (300, 100), (500, 100),
-            (500, 300), (600, 300)
-            ],
-        'buildSpots': [
-            (140, 170), (70, 90),
-            (340, 170), (260, 140),
-            (460, 140), (540, 260)
-            ],
-        'waves': generate_waves_for_level(1.0)
-    },
-    {
-        'id': 2, 'name': "Winding Woods", 'startGold': 350, 'startLives': 10,
-        'path': [
-            (0, 50), (150, 50),
-            (150, 350), (300, 350),
-            (300, 50), (450, 50),
-            (450, 350), (600, 350)
-        ],
-        'buildSpots': [
-            (95, 120), (55, 300), 
-            (245, 120), (205, 300),
-            (395, 120), (355, 300),
-            (545, 120), (505, 300)
-        ],
-        'waves': generate_waves_for_level(1.3)
-    },
-    {
-        'id': 3, 'name': "Black Castle", 'startGold': 500, 'startLives': 10,
-        'path': [
-            (50, 0), (50, 350), 
-            (550, 350), (550, 50),
-            (200, 50), (200, 250),
-            (400, 250), (400, 150)
-        ],
-        'buildSpots': [
-            (100, 120), (100, 280),
-            (500, 120), (500, 280),
-            (300, 120), (300, 300),
-            (250, 80), (350, 180)
-        ],
-        'waves': generate_waves_for_level(1.6)
-    }
-]
+CAMPAIGN_WAVES = 15
+ENDLESS_MIN_GAP = 120 # ticks between endless wave starts, however short the wave
+MAX_GROUP_COUNT = 150 # keeps endless waves finite in length
+
+def wave_groups(wave_num, difficulty_multiplier):
+    """Composition of wave `wave_num` (1-based) as (enemyType, count, interval,
+    delay) groups. Pure, so any wave can be generated on demand; nothing is
+    stored per level."""
+    # Determine enemy type
+    if wave_num % 15 == 0:
+        e_type = EnemyType.JUGGERNAUT
+        count = 2 + int(difficulty_multiplier)
+    elif wave_num % 5 == 0:
+        e_type = EnemyType.TANK
+        count = 3 + int(wave_num / 3)
+    elif wave_num % 4 == 0:
+        e_type = EnemyType.SHAMAN
+        count = 4 + int(wave_num / 2)
+    elif wave_num % 3 == 0:
+        e_type = EnemyType.SPRINTER
+        count = 8 + wave_num
+    elif wave_num % 2 == 0:
+        e_type = EnemyType.FAST
+        count = 10 + wave_num
+    else:
+        e_type = EnemyType.NORMAL
+        count = 10 + (wave_num * 2)
+
+    count = min(int(count * difficulty_multiplier), MAX_GROUP_COUNT)
+    interval = max(5, 60 - (wave_num * 3))
+    groups = [(e_type, count, interval, 0)]
+
+    # Past the campaign waves get escorts of the next type along, interleaved
+    # with the main group, and a Juggernaut every tenth wave
+    if wave_num > CAMPAIGN_WAVES:
+        types = list(EnemyType)
+        escort = types[(types.index(e_type) + wave_num) % len(types)]
+        if escort is not EnemyType.JUGGERNAUT and escort is not e_type:
+            groups.append((escort, max(1, count // 3), interval * 3, interval // 2))
+        if wave_num % 10 == 0 and e_type is not EnemyType.JUGGERNAUT:
+            groups.append((EnemyType.JUGGERNAUT, 1 + wave_num // 100, 90, count * interval // 2))
+    return groups
+
+def wave_length(groups):
+    return max(delay + (count - 1) * interval for _, count, interval, delay in groups)
 
 # --- UTILS & RENDERING ---
 
-def get_distance(p1, p2):
-    return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+class SpatialGrid:
+    """Uniform grid over logical coordinates for radius queries.
+
+    Items are bucketed by cell; query() only visits the cells overlapping the
+    query circle and compares squared distances, so no sqrt is needed.
+    Results come back in insertion order, which keeps "first enemy in the
+    list" targeting identical to a linear scan. Below `linear_max` items a
+    plain squared-distance scan beats the bucketing overhead, so the cells
+    are only filled once the grid gets crowded.
+    """
+    def __init__(self, cell_size=50, width=LOGICAL_WIDTH, height=LOGICAL_HEIGHT, linear_max=24):
+        self.cell_size = cell_size
+        self.cols = int(width // cell_size) + 1
+        self.rows = int(height // cell_size) + 1
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self.used = []
+        self.entries = []
+        self.linear_max = linear_max
+        self.bucketed = False
+
+    def clear(self):
+        for cell in self.used:
+            cell.clear()
+        self.used = []
+        self.entries = []
+        self.bucketed = False
+
+    def _bucket(self, idx, entry):
+        size = self.cell_size
+        cx = min(max(int(entry[1] // size), 0), self.cols - 1)
+        cy = min(max(int(entry[2] // size), 0), self.rows - 1)
+        cell = self.cells[cy * self.cols + cx]
+        if not cell:
+            self.used.append(cell)
+        cell.append((idx, entry))
+
+    def rebuild(self, items, xs=None, ys=None):
+        self.clear()
+        if xs is None:
+            self.entries = [(item, item.x, item.y) for item in items]
+        else:
+            self.entries = list(zip(items, xs, ys))
+        if len(self.entries) > self.linear_max:
+            self.bucketed = True
+            for idx, entry in enumerate(self.entries):
+                self._bucket(idx, entry)
+
+    def query(self, x, y, radius):
+        """Returns [(item, dist_sq), ...] for every item with dist <= radius."""
+        r2 = radius * radius
+        found = []
+        if not self.bucketed:
+            for item, ix, iy in self.entries:
+                dx = ix - x
+                dy = iy - y
+                d2 = dx*dx + dy*dy
+                if d2 <= r2:
+                    found.append((item, d2))
+            return found
+
+        size = self.cell_size
+        x0 = max(int((x - radius) // size), 0)
+        y0 = max(int((y - radius) // size), 0)
+        x1 = min(int((x + radius) // size), self.cols - 1)
+        y1 = min(int((y + radius) // size), self.rows - 1)
+        cells = self.cells
+        for cy in range(y0, y1 + 1):
+            row = cy * self.cols
+            for cell in cells[row + x0:row + x1 + 1]:
+                for idx, (item, ix, iy) in cell:
+                    dx = ix - x
+                    dy = iy - y
+                    d2 = dx*dx + dy*dy
+                    if d2 <= r2:
+                        found.append((idx, item, d2))
+        if len(found) > 1:
+            found.sort(key=lambda f: f[0])
+        return [(item, d2) for idx, item, d2 in found]
+
+class QuadTree:
+    """Static point quadtree for mouse picking.
+
+    Built in one pass from (item, x, y) entries: nodes split into quadrants
+    until they hold at most `capacity` points. nearest() descends only into
+    nodes whose box is closer than the best hit so far.
+    """
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'entries', 'children')
+
+    def __init__(self, entries, x0, y0, x1, y1, capacity=8, depth=0):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.children = None
+        if len(entries) <= capacity or depth >= 12:
+            self.entries = entries
+            return
+        mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+        quads = ([], [], [], [])
+        for entry in entries:
+            quads[(entry[1] >= mx) + 2 * (entry[2] >= my)].append(entry)
+        self.entries = ()
+        self.children = [QuadTree(q, bx0, by0, bx1, by1, capacity, depth + 1)
+                         for q, (bx0, by0, bx1, by1) in zip(quads, (
+                             (x0, y0, mx, my), (mx, y0, x1, my), (x0, my, mx, y1), (mx, my, x1, y1))) if q]
+
+    @classmethod
+    def build(cls, items, xs=None, ys=None):
+        if xs is None:
+            entries = [(item, item.x, item.y) for item in items]
+        else:
+            entries = list(zip(items, xs, ys))
+        if not entries:
+            return cls(entries, 0, 0, 0, 0)
+        xs = [e[1] for e in entries]
+        ys = [e[2] for e in entries]
+        return cls(entries, min(xs), min(ys), max(xs), max(ys))
+
+    def nearest(self, x, y, radius):
+        """The item closest to (x, y) within radius, or None."""
+        best, best_d2 = None, radius * radius
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            dx = max(node.x0 - x, 0, x - node.x1)
+            dy = max(node.y0 - y, 0, y - node.y1)
+            if dx*dx + dy*dy > best_d2:
+                continue
+            if node.children:
+                stack.extend(node.children)
+                continue
+            for item, ix, iy in node.entries:
+                d2 = (ix - x)**2 + (iy - y)**2
+                if d2 <= best_d2:
+                    best, best_d2 = item, d2
+        return best
+
+class PathTable:
+    """A level path compiled once into per-segment unit vectors and a
+    cumulative arc-length table.
+
+    Enemies only track the scalar distance they have travelled; positions
+    come from position_on() in O(1) when the segment is known, or from
+    position_at() via bisect otherwise.
+    """
+    def __init__(self, path):
+        self.points = [tuple(p) for p in path]
+        self.cum = [0.0]
+        self.ux = []
+        self.uy = []
+        self.angles = []
+        for (x0, y0), (x1, y1) in zip(self.points, self.points[1:]):
+            dx, dy = x1 - x0, y1 - y0
+            length = math.sqrt(dx*dx + dy*dy)
+            self.cum.append(self.cum[-1] + length)
+            self.ux.append(dx / length if length else 0.0)
+            self.uy.append(dy / length if length else 0.0)
+            self.angles.append(math.atan2(dy, dx))
+        # The last node has no outgoing segment
+        self.ux.append(0.0)
+        self.uy.append(0.0)
+        self.length = self.cum[-1]
+
+    @classmethod
+    def from_arrays(cls, path, cum, ux, uy, angles):
+        # Tables loaded from a level cache; ux/uy already end with the 0.0 pad.
+        # Copied to lists: they are tiny and indexed on every enemy move.
+        table = cls.__new__(cls)
+        table.points = [tuple(p) for p in path]
+        table.cum, table.ux, table.uy, table.angles = list(cum), list(ux), list(uy), list(angles)
+        table.length = cum[-1]
+        return table
+
+    def segment_at(self, dist):
+        return min(max(bisect_right(self.cum, dist) - 1, 0), len(self.points) - 2)
+
+    def position_on(self, seg, dist):
+        x0, y0 = self.points[seg]
+        d = dist - self.cum[seg]
+        return x0 + self.ux[seg] * d, y0 + self.uy[seg] * d
+
+    def position_at(self, dist):
+        return self.position_on(self.segment_at(dist), dist)
+
+    def coverage(self, cx, cy, radius):
+        """Sorted, merged [(d0, d1), ...] ranges of path distance whose points
+        lie within radius of (cx, cy)."""
+        spans = []
+        r2 = radius * radius
+        for seg in range(len(self.points) - 1):
+            seg_len = self.cum[seg + 1] - self.cum[seg]
+            if seg_len <= 0: continue
+            # |p0 + u*s - c|^2 = r^2 with |u| = 1
+            fx, fy = self.points[seg][0] - cx, self.points[seg][1] - cy
+            b = fx * self.ux[seg] + fy * self.uy[seg]
+            disc = b*b - (fx*fx + fy*fy - r2)
+            if disc < 0: continue
+            root = math.sqrt(disc)
+            s0, s1 = max(-b - root, 0.0), min(-b + root, seg_len)
+            if s0 > s1: continue
+            d0, d1 = self.cum[seg] + s0, self.cum[seg] + s1
+            if spans and d0 <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], d1))
+            else:
+                spans.append((d0, d1))
+        return spans
+
+_PATH_TABLES = {}
+
+def get_path_table(path):
+    key = tuple(tuple(p) for p in path)
+    table = _PATH_TABLES.get(key)
+    if table is None:
+        table = _PATH_TABLES[key] = PathTable(path)
+    return table
 
 def generate_enhanced_sprite(data, render_scale):
     pixel_size = int(max(4, render_scale)) 
@@ -333,24 +552,140 @@ def generate_enhanced_sprite(data, render_scale):
     c_main = COLOR_WHITE
     c_shadow = (50, 50, 50)
     
-    for r, row in enumerate(data):
-        for c, char in enumerate(row):
-            if char == '#':
-                x = c * (pixel_size + margin)
-                y = r * (pixel_size + margin)
-                rect = pygame.Rect(x, y, pixel_size, pixel_size)
-                pygame.draw.rect(surf, c_shadow, rect)
-                rect_body = pygame.Rect(x + 1, y + 1, pixel_size - 2, pixel_size - 2)
-                pygame.draw.rect(surf, c_main, rect_body)
+    # One pre-drawn cell, stamped onto every '#' in a single blits() call
+    cell = pygame.Surface((pixel_size, pixel_size), pygame.SRCALPHA)
+    cell.fill(c_shadow)
+    cell.fill(c_main, (1, 1, pixel_size - 2, pixel_size - 2))
+    step = pixel_size + margin
+    surf.blits([(cell, (c * step, r * step))
+                for r, row in enumerate(data)
+                for c, char in enumerate(row) if char == '#'], False)
     return surf
 
+# Sprites only depend on the integer pixel size, so most resizes are cache hits
+_SPRITE_ATLAS = {}
+_SPRITE_ATLAS_CONVERTED = set() # pixel sizes already in the display's format
+
+def get_sprite_atlas(render_scale, convert=True):
+    # Building never touches the display, so the asset loader can do it on its
+    # thread with convert=False; the main thread converts on its next call
+    pixel_size = int(max(4, render_scale))
+    atlas = _SPRITE_ATLAS.get(pixel_size)
+    if atlas is None:
+        atlas = {}
+        for k, v in SPRITE_DATA.items():
+            spr = generate_enhanced_sprite(v, pixel_size)
+            atlas[k] = spr
+            # Variants are drawn the same way; share the surface
+            for variant in ('SLOW', 'DISABLED', 'BUILD', 'SELECTED'):
+                atlas[f"{k}_{variant}"] = spr
+        _SPRITE_ATLAS[pixel_size] = atlas
+    if convert and pixel_size not in _SPRITE_ATLAS_CONVERTED and pygame.display.get_surface():
+        converted = {}
+        for k, spr in list(atlas.items()):
+            if id(spr) not in converted:
+                converted[id(spr)] = spr.convert_alpha()
+            atlas[k] = converted[id(spr)]
+        _SPRITE_ATLAS_CONVERTED.add(pixel_size)
+    return atlas
+
+# Per-entity shapes in screen pixels. Only the rock trail scales with the
+# view, so sets are keyed by its length and share every other surface.
+_FX_SPRITES = {} # trail length -> sprite set
+_FX_FIXED = {} # shapes that never scale, built once
+HP_BAR_STEPS = 12 # health bars are drawn from this many pre-rendered fill levels
+
+def _fx_canvas(w, h):
+    surf = pygame.Surface((w, h))
+    surf.set_colorkey(COLOR_BLACK, pygame.RLEACCEL)
+    return surf
+
+def get_fx_sprites(render_scale):
+    """Rings, health bars, level pips, hex marks and shots as
+    (surface, ox, oy), where (ox, oy) is the entity centre inside the
+    surface, so the game layer can draw everything with one blits()."""
+    trail = max(int(10 * render_scale), 8)
+    fx = _FX_SPRITES.get(trail)
+    if fx is not None:
+        return fx
+
+    if not _FX_FIXED:
+        fixed = _FX_FIXED
+        ring = _fx_canvas(51, 51)
+        pygame.draw.circle(ring, COLOR_WHITE, (25, 25), 25, 1)
+        fixed['RING'] = (ring, 25, 25)
+
+        for k in range(HP_BAR_STEPS + 1):
+            bar = _fx_canvas(40, 6)
+            pygame.draw.rect(bar, COLOR_WHITE, (0, 0, 40, 6), 1)
+            pygame.draw.rect(bar, COLOR_WHITE, (2, 2, 36 * k // HP_BAR_STEPS, 2))
+            fixed[('HP', k)] = (bar, 20, 35)
+
+        for level in range(1, 5):
+            pips = _fx_canvas(10 * level - 4, 6)
+            for l in range(level):
+                pips.fill(COLOR_WHITE, (l * 10, 0, 6, 6))
+            fixed[('PIPS', level)] = (pips, 15, 40)
+
+        hex_mark = _fx_canvas(44, 44)
+        pygame.draw.line(hex_mark, COLOR_WHITE, (2, 2), (42, 42), 4)
+        pygame.draw.line(hex_mark, COLOR_WHITE, (42, 2), (2, 42), 4)
+        fixed['HEX'] = (hex_mark, 22, 22)
+
+        sap = _fx_canvas(13, 13)
+        pygame.draw.circle(sap, COLOR_WHITE, (6, 6), 6)
+        fixed[('SHOT', TowerType.SAP)] = (sap, 6, 6)
+        arrow = _fx_canvas(8, 8)
+        arrow.fill(COLOR_WHITE)
+        fixed[('SHOT', TowerType.ARCHER)] = (arrow, 4, 4)
+
+    fx = dict(_FX_FIXED)
+    rock = _fx_canvas(trail + 8, 16)
+    rock.fill(COLOR_WHITE, (trail - 8, 0, 16, 16))
+    pygame.draw.line(rock, COLOR_GRAY, (trail, 8), (0, 8), 4)
+    fx[('SHOT', TowerType.ROCK)] = (rock, trail, 8)
+
+    _FX_SPRITES[trail] = fx
+    return fx
+
+class TextCache:
+    """Bounded LRU cache of rendered text surfaces.
+
+    HUD, menu and tooltip strings rarely change between frames, so the
+    rasterized surface is reused. Call clear() whenever fonts are rebuilt.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        key = (font, text, antialias, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
 # --- ENTITY CLASSES ---
 
 class Enemy:
     def __init__(self, e_type, path, wave_idx):
         self.type = e_type
         self.path = path
+        self.table = get_path_table(path)
         self.path_index = 0
+        self.distance = 0.0 # travelled along the path
         self.x, self.y = path[0]
         self.id = id(self)
         
@@ -372,58 +707,234 @@ class Enemy:
         self.hp = base_hp * hp_mult
         self.max_hp = self.hp
         
+        # Effects end at absolute ticks instead of counting down; the Simulation
+        # sets these and its EffectTimers reset frozen_factor on expiry
         self.frozen_factor = 1.0
-        self.frozen_timer = 0
-        self.poison_timer = 0
-        self.skill_cooldown = 90
+        self.frozen_until = 0
+        self.poison_until = 0
+        self.skill_ready_at = 0
 
-    def update(self):
-        self.frozen_factor = 1.0 if self.frozen_timer <= 0 else self.frozen_factor
-        if self.frozen_timer > 0: self.frozen_timer -= 1
-        
-        if self.poison_timer > 0:
+    def update(self, tick):
+        if self.poison_until > tick:
             self.hp -= 0.05
-            self.poison_timer -= 1
 
         if self.path_index + 1 >= len(self.path):
             return True 
 
-        target_node = self.path[self.path_index + 1]
-        dx = target_node[0] - self.x
-        dy = target_node[1] - self.y
-        dist = math.sqrt(dx*dx + dy*dy)
-
-        
+        # Reaching a node ends the step there, as the old per-tick trig did
+        table = self.table
+        node_dist = table.cum[self.path_index + 1]
         actual_speed = self.speed * self.frozen_factor
         
-        if dist <= actual_speed:
-            self.x, self.y = target_node
+        if node_dist - self.distance <= actual_speed:
+            self.distance = node_dist
             self.path_index += 1
+            self.x, self.y = self.path[self.path_index]
             if self.path_index >= len(self.path) - 1:
                 return True
         else:
-            angle = math.atan2(dy, dx)
-            self.x += math.cos(angle) * actual_speed
-            self.y += math.sin(angle) * actual_speed
+            self.distance += actual_speed
+            self.x, self.y = table.position_on(self.path_index, self.distance)
         
         return False
 
+def _store_field(name):
+    def fget(self):
+        if self.slot < 0: return self.detached[name]
+        return getattr(self.store, name)[self.slot].item()
+    def fset(self, value):
+        if self.slot < 0: self.detached[name] = value
+        else: getattr(self.store, name)[self.slot] = value
+    return property(fget, fset)
+
+class EnemyRef:
+    """Enemy-shaped handle into an EnemyStore row.
+
+    Towers, projectiles and the renderer use it exactly like an Enemy. When
+    the row is removed the handle keeps a snapshot of its last values, so
+    projectiles still homing on it behave as they would with a dead Enemy.
+    """
+    __slots__ = ('store', 'slot', 'type', 'path', 'table', 'max_hp', 'id', 'detached')
+
+    x = _store_field('x')
+    y = _store_field('y')
+    hp = _store_field('hp')
+    speed = _store_field('speed')
+    path_index = _store_field('path_index')
+    distance = _store_field('distance')
+    frozen_factor = _store_field('frozen_factor')
+    frozen_until = _store_field('frozen_until')
+    poison_until = _store_field('poison_until')
+    skill_ready_at = _store_field('skill_ready_at')
+
+    def __init__(self, store, slot, enemy):
+        self.store = store
+        self.slot = slot
+        self.type = enemy.type
+        self.path = enemy.path
+        self.table = enemy.table
+        self.max_hp = enemy.max_hp
+        self.id = id(self)
+        self.detached = None
+
+    def detach(self):
+        self.detached = {f: getattr(self.store, f)[self.slot].item() for f in EnemyStore.FIELDS}
+        self.slot = -1
+
+class EnemyStore:
+    """Struct-of-arrays enemy storage, stepped with batched NumPy operations.
+
+    Each field lives in one contiguous array; rows [0, n) are live and kept in
+    spawn order so targeting still sees enemies in list order. step() mirrors
+    Enemy.update() for every row at once using the same PathTable arithmetic,
+    so results match the per-object path.
+    """
+    FIELDS = ('x', 'y', 'hp', 'speed', 'path_index', 'distance', 'frozen_factor',
+              'frozen_until', 'poison_until', 'skill_ready_at', 'is_shaman', 'bounty')
+    DTYPES = {'path_index': 'int64', 'frozen_until': 'int64', 'poison_until': 'int64',
+              'skill_ready_at': 'int64', 'is_shaman': 'bool', 'bounty': 'int64'}
+
+    def __init__(self, path, capacity=256):
+        if np is None:
+            raise RuntimeError("EnemyStore requires numpy")
+        table = get_path_table(path)
+        self.px = np.array([p[0] for p in table.points], dtype='float64')
+        self.py = np.array([p[1] for p in table.points], dtype='float64')
+        self.cum = np.array(table.cum, dtype='float64')
+        self.ux = np.array(table.ux, dtype='float64')
+        self.uy = np.array(table.uy, dtype='float64')
+        self.n = 0
+        self.capacity = capacity
+        self.refs = []
+        self.remap = None # old slot -> new slot (-1 if removed) after the last step() compacted
+        for f in self.FIELDS:
+            setattr(self, f, np.zeros(capacity, dtype=self.DTYPES.get(f, 'float64')))
+
+    def _grow(self):
+        self.capacity *= 2
+        for f in self.FIELDS:
+            old = getattr(self, f)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, f, new)
+
+    def add(self, enemy):
+        if self.n == self.capacity:
+            self._grow()
+        i = self.n
+        self.x[i] = enemy.x
+        self.y[i] = enemy.y
+        self.hp[i] = enemy.hp
+        self.speed[i] = enemy.speed
+        self.path_index[i] = enemy.path_index
+        self.distance[i] = enemy.distance
+        self.frozen_factor[i] = enemy.frozen_factor
+        self.frozen_until[i] = enemy.frozen_until
+        self.poison_until[i] = enemy.poison_until
+        self.skill_ready_at[i] = enemy.skill_ready_at
+        self.is_shaman[i] = enemy.type == EnemyType.SHAMAN
+        self.bounty[i] = ENEMY_BOUNTY[enemy.type]
+        ref = EnemyRef(self, i, enemy)
+        self.refs.append(ref)
+        self.n += 1
+        return ref
+
+    def step(self, tick):
+        """Advances every live row one tick. Returns (bounty_gold, leaked_count)."""
+        self.remap = None
+        n = self.n
+        if n == 0:
+            return 0, 0
+        x, y, hp, dist = self.x[:n], self.y[:n], self.hp[:n], self.distance[:n]
+        pi, ff = self.path_index[:n], self.frozen_factor[:n]
+
+        # Dead enemies pay out and are removed before they move
+        dead = hp <= 0
+        gold = int(self.bounty[:n][dead].sum())
+        alive = ~dead
+
+        hp[alive & (self.poison_until[:n] > tick)] -= 0.05
+
+        last = len(self.px) - 1
+        leaked = alive & (pi + 1 > last)
+        idx = np.flatnonzero(alive & ~leaked)
+        if idx.size:
+            node_dist = self.cum[pi[idx] + 1]
+            spd = self.speed[idx] * ff[idx]
+
+            arrive = node_dist - dist[idx] <= spd
+            a = idx[arrive]
+            dist[a] = node_dist[arrive]
+            pi[a] += 1
+            leaked[a[pi[a] >= last]] = True
+
+            w = idx[~arrive]
+            dist[w] += spd[~arrive]
+
+            # Arrived rows sit exactly on their node: cum[pi] == dist there
+            seg = pi[idx]
+            d = dist[idx] - self.cum[seg]
+            x[idx] = self.px[seg] + self.ux[seg] * d
+            y[idx] = self.py[seg] + self.uy[seg] * d
+
+        n_leaked = int(leaked.sum())
+        if gold or n_leaked:
+            self._compact(~(dead | leaked))
+        return gold, n_leaked
+
+    def _compact(self, keep):
+        keep_idx = np.flatnonzero(keep)
+        refs = self.refs
+        removed = np.flatnonzero(~keep)
+        for i in removed:
+            refs[i].detach()
+        for f in self.FIELDS:
+            arr = getattr(self, f)
+            arr[:keep_idx.size] = arr[keep_idx]
+        # Rows before the first removal keep their slot
+        first = int(removed[0])
+        refs[:] = [refs[i] for i in keep_idx]
+        for j in range(first, len(refs)):
+            refs[j].slot = j
+        self.remap = np.full(self.n, -1, dtype='int64')
+        self.remap[keep_idx] = np.arange(keep_idx.size)
+        self.n = keep_idx.size
+
+def tower_range(t_type, level, sniper=False):
+    rng = TOWER_STATS[t_type]['range'] * (1 + (level - 1) * 0.2)
+    if sniper: rng *= 1.5
+    return rng
+
 class Tower:
-    def __init__(self, t_type, x, y):
+    def __init__(self, t_type, x, y, spot_idx=None):
         self.type = t_type
         self.x = x
         self.y = y
+        self.spot_idx = spot_idx
         self.level = 1
-        self.cooldown_timer = 0
-        self.disabled_timer = 0
+        self.ready_at = 0 # first tick the cooldown allows a shot
+        self.disabled_until = 0 # first tick it may fire again after a Shaman hex
+        self.seq = 0 # build order; keeps same-tick wake-ups in list order
+        self.wake_at = None # tick it is queued to act on; None while asleep
         self.passives = [] 
         self.id = id(self)
+        self.target_policy = TargetPolicy.FIRST
+        self.coverage = [] # path-distance ranges inside get_range(), set by the Simulation
 
     def has_passive(self, pid):
         return pid in self.passives
 
+    def get_range(self):
+        return tower_range(self.type, self.level, self.has_passive('SNIPER'))
+
 class Projectile:
+    __slots__ = ('type', 'x', 'y', 'target', 'damage', 'passives', 'speed', 'active',
+                 'is_splash', 'slow_duration', 'stun_duration')
+
     def __init__(self, p_type, x, y, target, damage, passives_snapshot):
+        self.reset(p_type, x, y, target, damage, passives_snapshot)
+
+    def reset(self, p_type, x, y, target, damage, passives_snapshot):
         self.type = p_type
         self.x = x
         self.y = y
@@ -450,25 +961,1464 @@ class Projectile:
             self.active = False
             return True 
         else:
-            angle = math.atan2(dy, dx)
-            self.x += math.cos(angle) * self.speed
-            self.y += math.sin(angle) * self.speed
+            # Unit vector toward the target; same arithmetic as ProjectileStore.step()
+            self.x += dx / dist * self.speed
+            self.y += dy / dist * self.speed
             return False
 
+class ProjectilePool:
+    """Recycles spent Projectiles so long waves don't keep allocating.
+
+    Tracks live count, high-water mark and how many objects were ever
+    allocated vs. reused, so allocation stays flat once the pool is warm.
+    """
+    def __init__(self):
+        self.free = []
+        self.live = 0
+        self.high_water = 0
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, p_type, x, y, target, damage, passives_snapshot):
+        if self.free:
+            p = self.free.pop()
+            p.reset(p_type, x, y, target, damage, passives_snapshot)
+            self.reused += 1
+        else:
+            p = Projectile(p_type, x, y, target, damage, passives_snapshot)
+            self.allocated += 1
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return p
+
+    def release(self, p):
+        p.target = None # don't keep dead enemies alive
+        self.free.append(p)
+        self.live -= 1
+
+    def stats(self):
+        return {'live': self.live, 'high_water': self.high_water,
+                'allocated': self.allocated, 'reused': self.reused}
+
+class ProjectileStore:
+    """Projectile kinematics as NumPy arrays, for use next to an EnemyStore.
+
+    Rows line up with Simulation.projectiles. The Projectile objects keep
+    type, damage and passives; step() moves every row at once against the
+    target rows in the EnemyStore and writes x/y back to the objects, so
+    drawing and hashing read them as usual.
+    """
+    FIELDS = ('x', 'y', 'speed', 'tslot')
+
+    def __init__(self, enemy_store, capacity=128, batch_min=12):
+        self.enemies = enemy_store
+        self.batch_min = batch_min # below this, per-object updates are cheaper
+        self.n = 0
+        self.capacity = capacity
+        for f in self.FIELDS:
+            setattr(self, f, np.zeros(capacity, dtype='int64' if f == 'tslot' else 'float64'))
+
+    def add(self, p):
+        if self.n == self.capacity:
+            self.capacity *= 2
+            for f in self.FIELDS:
+                old = getattr(self, f)
+                new = np.zeros(self.capacity, dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, f, new)
+        i = self.n
+        self.x[i] = p.x
+        self.y[i] = p.y
+        self.speed[i] = p.speed
+        self.tslot[i] = p.target.slot
+        self.n += 1
+
+    def remap_targets(self, remap):
+        ts = self.tslot[:self.n]
+        attached = ts >= 0
+        ts[attached] = remap[ts[attached]]
+
+    def step(self, projectiles):
+        """Mirrors Projectile.update() for every row. Returns the hit flags."""
+        n = self.n
+        if n < self.batch_min:
+            hits = [p.update() for p in projectiles]
+            x, y = self.x, self.y
+            for i, p in enumerate(projectiles):
+                x[i] = p.x
+                y[i] = p.y
+            return hits
+        x, y, spd, ts = self.x[:n], self.y[:n], self.speed[:n], self.tslot[:n]
+        es = self.enemies
+        attached = ts >= 0
+        rows = ts[attached]
+        tx = np.empty(n)
+        ty = np.empty(n)
+        thp = np.empty(n)
+        tx[attached] = es.x[rows]
+        ty[attached] = es.y[rows]
+        thp[attached] = es.hp[rows]
+        # Targets removed from the store (leaked) keep flying on their snapshot
+        for i in np.flatnonzero(~attached).tolist():
+            t = projectiles[i].target
+            tx[i], ty[i], thp[i] = t.x, t.y, t.hp
+
+        live = thp > 0
+        dx = tx - x
+        dy = ty - y
+        dist = np.sqrt(dx*dx + dy*dy)
+        hit = live & (dist < spd)
+        move = live & ~hit
+        x[move] += dx[move] / dist[move] * spd[move]
+        y[move] += dy[move] / dist[move] * spd[move]
+
+        for p, px, py, m in zip(projectiles, x.tolist(), y.tolist(), move.tolist()):
+            p.x = px
+            p.y = py
+            if not m: p.active = False
+        return hit.tolist()
+
+    def compact(self, keep):
+        keep_idx = np.flatnonzero(keep)
+        for f in self.FIELDS:
+            arr = getattr(self, f)
+            arr[:keep_idx.size] = arr[keep_idx]
+        self.n = keep_idx.size
+
+# --- PROFILING ---
+
+class FrameProfiler:
+    """Per-frame timings for each subsystem, kept over a rolling window.
+
+    Sections are accumulated with add() (seconds) and closed with
+    end_frame(); several simulation ticks in one rendered frame add up.
+    Only exists while the overlay is on, so a disabled profiler costs one
+    None check per section.
+    """
+    SECTIONS = ('events', 'wave_spawn', 'targeting', 'projectiles', 'enemies',
+                'draw_game_layer', 'draw_ui', 'flip')
+    COUNTS = ('enemies', 'projectiles', 'towers')
+
+    def __init__(self, window=3600, summary_every=30):
+        self.current = dict.fromkeys(self.SECTIONS, 0.0)
+        self.frames = deque(maxlen=window) # (ms per section..., frame ms, counts...)
+        self.summary_every = summary_every
+        self.summary = None
+        self.frame_no = 0
+
+    def add(self, section, seconds):
+        self.current[section] += seconds * 1000
+
+    def end_frame(self, frame_seconds, counts):
+        cur = self.current
+        self.frames.append(tuple(cur[s] for s in self.SECTIONS) + (frame_seconds * 1000,) + tuple(counts))
+        for s in self.SECTIONS:
+            cur[s] = 0.0
+        self.frame_no += 1
+        if self.summary is None or self.frame_no % self.summary_every == 0:
+            self.summary = self.summarize(120)
+
+    def summarize(self, last_n):
+        recent = list(self.frames)[-last_n:]
+        if not recent: return None
+        names = self.SECTIONS + ('frame',)
+        summary = {}
+        for i, name in enumerate(names):
+            values = [f[i] for f in recent]
+            summary[name] = (percentile(values, 50), percentile(values, 95), percentile(values, 99))
+        summary['counts'] = recent[-1][len(names):]
+        return summary
+
+    def export_csv(self, path):
+        import csv
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([f"{s}_ms" for s in self.SECTIONS] + ['frame_ms'] + list(self.COUNTS))
+            for row in self.frames:
+                writer.writerow([f"{v:.4f}" if isinstance(v, float) else v for v in row])
+        return path
+
+# --- LEVEL FILES ---
+
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels')
+LEVEL_CACHE_DIR = os.path.join(LEVEL_DIR, '.cache')
+LEVEL_CACHE_VERSION = 1
+SPOT_HIT_SIZE = 20 # half-width of a build spot's click box, logical px
+ENEMY_PICK_RADIUS = 12 # hover distance for enemy info, logical px
+HIT_CELL = 2 * SPOT_HIT_SIZE
+
+def coverage_radii():
+    """Every range a tower can have, so spot coverage can be precomputed."""
+    return sorted({tower_range(t_type, level, sniper)
+                   for t_type in TowerType for level in range(1, 5) for sniper in (False, True)})
+
+def build_level_geometry(level, radii):
+    """Serializes a level's derived geometry into the flat cache format:
+    magic, version, JSON header length, JSON header, then 8-byte aligned
+    native arrays listed in the header as name -> [offset, typecode, count]."""
+    table = PathTable(level['path'])
+    spots = level['buildSpots']
+    cols, rows = LOGICAL_WIDTH // HIT_CELL + 1, LOGICAL_HEIGHT // HIT_CELL + 1
+
+    # Click cell -> spots whose hit box touches it, in spot order
+    cells = [[] for _ in range(cols * rows)]
+    for i, (sx, sy) in enumerate(spots):
+        c0, c1 = max(int((sx - SPOT_HIT_SIZE) // HIT_CELL), 0), min(int((sx + SPOT_HIT_SIZE) // HIT_CELL), cols - 1)
+        r0, r1 = max(int((sy - SPOT_HIT_SIZE) // HIT_CELL), 0), min(int((sy + SPOT_HIT_SIZE) // HIT_CELL), rows - 1)
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                cells[r * cols + c].append(i)
+    hit_start, hit_spots = [0], []
+    for cell in cells:
+        hit_spots.extend(cell)
+        hit_start.append(len(hit_spots))
+
+    cov_start, cov = [0], []
+    for sx, sy in spots:
+        for r in radii:
+            for span in table.coverage(sx, sy, r):
+                cov.extend(span)
+            cov_start.append(len(cov) // 2)
+
+    angle = table.angles[0] if table.angles else 0.0
+    arrow = [math.cos(angle), math.sin(angle), math.cos(angle + 2.5), math.sin(angle + 2.5),
+             math.cos(angle - 2.5), math.sin(angle - 2.5)]
+
+    arrays = {
+        'cum': array('d', table.cum), 'ux': array('d', table.ux), 'uy': array('d', table.uy),
+        'angles': array('d', table.angles), 'arrow': array('d', arrow),
+        'hit_start': array('i', hit_start), 'hit_spots': array('i', hit_spots),
+        'cov_start': array('i', cov_start), 'cov': array('d', cov),
+    }
+    sections, body, offset = {}, [], 0
+    for name, arr in arrays.items():
+        data = arr.tobytes()
+        data += b'\0' * (-len(data) % 8)
+        sections[name] = [offset, arr.typecode, len(arr)]
+        body.append(data)
+        offset += len(data)
+    header = json.dumps({'radii': radii, 'grid': [cols, rows], 'sections': sections}).encode()
+    header += b' ' * (-(len(header) + 12) % 8)
+    return LevelGeometry.MAGIC + struct.pack('<II', LEVEL_CACHE_VERSION, len(header)) + header + b''.join(body)
+
+class LevelGeometry:
+    """A level's precomputed geometry: path table, build-spot hit grid and
+    each spot's path coverage at every tower range.
+
+    Sections are typed memoryviews straight over the buffer, which is a
+    read-only mmap of the cache file, so loading parses only the header.
+    """
+    MAGIC = b'TDLV'
+
+    def __init__(self, buf, level):
+        if bytes(buf[:4]) != self.MAGIC:
+            raise ValueError("not a level cache")
+        version, header_len = struct.unpack_from('<II', buf, 4)
+        if version != LEVEL_CACHE_VERSION:
+            raise ValueError("stale level cache")
+        header = json.loads(bytes(buf[12:12 + header_len]))
+        self.buf = buf # keeps the mmap alive
+        view = memoryview(buf)[12 + header_len:]
+        for name, (offset, typecode, count) in header['sections'].items():
+            size = count * struct.calcsize(typecode)
+            setattr(self, name, view[offset:offset + size].cast(typecode))
+        self.radii = header['radii']
+        self.radius_index = {r: k for k, r in enumerate(self.radii)}
+        self.cols, self.rows = header['grid']
+        self.spots = level['buildSpots']
+        self.path_table = PathTable.from_arrays(level['path'], self.cum, self.ux, self.uy, self.angles)
+
+    @classmethod
+    def open(cls, path, level):
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf, level)
+
+    def spot_at(self, x, y):
+        """Index of the build spot whose click box contains (x, y), or None."""
+        c, r = int(x // HIT_CELL), int(y // HIT_CELL)
+        if not (0 <= c < self.cols and 0 <= r < self.rows):
+            return None
+        cell = r * self.cols + c
+        for i in self.hit_spots[self.hit_start[cell]:self.hit_start[cell + 1]]:
+            sx, sy = self.spots[i]
+            if abs(sx - x) < SPOT_HIT_SIZE and abs(sy - y) < SPOT_HIT_SIZE:
+                return i
+        return None
+
+    def coverage(self, spot_idx, radius):
+        """Cached PathTable.coverage() for a spot, or None for an uncached radius."""
+        k = self.radius_index.get(radius)
+        if k is None:
+            return None
+        k += spot_idx * len(self.radii)
+        cov = self.cov
+        return [(cov[2*j], cov[2*j + 1]) for j in range(self.cov_start[k], self.cov_start[k + 1])]
+
+def load_level_geometry(level, raw, stem, cache_dir=LEVEL_CACHE_DIR):
+    # Keyed by file contents; the radii check catches edited tower ranges
+    path = os.path.join(cache_dir, f"{stem}-{hashlib.sha256(raw).hexdigest()[:16]}.bin")
+    radii = coverage_radii()
+    try:
+        geo = LevelGeometry.open(path, level)
+        if geo.radii == radii:
+            return geo
+    except (OSError, ValueError):
+        pass
+
+    blob = build_level_geometry(level, radii)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        for name in os.listdir(cache_dir):
+            if name.startswith(f"{stem}-") and name.endswith('.bin') and os.path.join(cache_dir, name) != path:
+                os.remove(os.path.join(cache_dir, name))
+        return LevelGeometry.open(path, level)
+    except OSError:
+        # Read-only install: use the geometry without caching it
+        return LevelGeometry(blob, level)
+
+# Required top-level fields of a level file and their JSON types
+LEVEL_FIELDS = {'id': int, 'name': str, 'startGold': int, 'startLives': int, 'difficulty': (int, float)}
+
+def parse_points(level, key, min_count):
+    points = level.get(key)
+    if not isinstance(points, list) or len(points) < min_count:
+        raise ValueError(f"'{key}' needs a list of at least {min_count} [x, y] points")
+    for p in points:
+        if not (isinstance(p, list) and len(p) == 2 and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in p)):
+            raise ValueError(f"'{key}' has a bad point {p!r}")
+    return [tuple(p) for p in points]
+
+def validate_level(level):
+    """Checks a decoded level file; raises ValueError naming the first problem."""
+    if not isinstance(level, dict):
+        raise ValueError("not a JSON object")
+    for key, kind in LEVEL_FIELDS.items():
+        if key not in level:
+            raise ValueError(f"missing '{key}'")
+        if not isinstance(level[key], kind) or isinstance(level[key], bool):
+            raise ValueError(f"'{key}' has the wrong type")
+    # A single point gives a zero-length path every enemy leaks off at once
+    level['path'] = parse_points(level, 'path', 2)
+    level['buildSpots'] = parse_points(level, 'buildSpots', 0)
+
+def load_levels(level_dir=LEVEL_DIR, cache_dir=LEVEL_CACHE_DIR):
+    """Reads every levels/*.json, sorted by id. Geometry comes from the
+    cache when the file is unchanged, so adding levels costs a hash and an
+    mmap each at startup."""
+    levels = []
+    try:
+        names = sorted(n for n in os.listdir(level_dir) if n.endswith('.json'))
+    except OSError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(level_dir, name), 'rb') as f:
+                raw = f.read()
+            level = json.loads(raw)
+            validate_level(level)
+            level['geometry'] = load_level_geometry(level, raw, name[:-5], cache_dir)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Skipping level file {name!r}: {e}")
+            continue
+        _PATH_TABLES[tuple(level['path'])] = level['geometry'].path_table
+        levels.append(level)
+    if not levels:
+        print(f"No level files found in {level_dir}.")
+    levels.sort(key=lambda l: l['id'])
+    return levels
+
+LEVELS = load_levels()
+
+# --- SIMULATION ---
+
+class EffectTimers:
+    """Heap of (tick, kind, entity) expiries for timed status effects.
+
+    Entities keep the absolute tick an effect ends at; re-applying one just
+    pushes a new entry and the superseded entry is skipped when it pops, so a
+    tick costs O(expiring effects) instead of a decrement on every entity.
+    """
+    def __init__(self):
+        self.heap = []
+        self.seq = 0 # tie-break so entries never compare entities
+
+    def add(self, tick, kind, obj):
+        self.seq += 1
+        heapq.heappush(self.heap, (tick, self.seq, kind, obj))
+
+    def due(self, tick):
+        heap = self.heap
+        while heap and heap[0][0] <= tick:
+            when, _, kind, obj = heapq.heappop(heap)
+            yield when, kind, obj
+
+class Simulation:
+    """Headless game state for one level. Never touches pygame.
+
+    Owns towers, enemies, projectiles, gold, lives and the wave state and
+    advances everything by exactly one tick per step() call.
+    """
+    def __init__(self, level_data, use_numpy=False, seed=None, scheduled_hits=False, endless=False, poll_towers=False):
+        self.level = level_data
+        # Endless: waves start on a timer, overlapping the previous one, until lives run out
+        self.endless = endless
+        self.wave_count = None if endless else CAMPAIGN_WAVES
+        self.lives = level_data['startLives']
+        self.gold = level_data['startGold']
+        self.wave_index = 0
+        self.state = GameState.PLAYING
+        self.tick = 0
+        self.layout_version = 0 # bumped on every build/sell
+
+        # All randomness comes from here so a (seed, commands) pair replays exactly
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.commands = [] # [tick, command, args...] for every accepted command
+
+        self.path_table = get_path_table(level_data['path'])
+        self.towers = []
+        self.spot_towers = [None] * len(level_data['buildSpots']) # spot index -> Tower
+        self.enemies = []
+        self.projectiles = []
+        self.projectile_pool = ProjectilePool()
+        # Opt-in: shots skip flight and land on a precomputed tick (headless, sweeps)
+        self.scheduled_hits = scheduled_hits
+        self.impacts = [] # heap of (tick, shot_no, Projectile)
+        self.shots_fired = 0
+        self.effects = EffectTimers()
+        # Towers only act when queued: on cooldown expiry or a predicted enemy arrival
+        self.tower_wakes = [] # heap of (tick, seq, Tower)
+        self.poll_towers = poll_towers # reference path: check every tower every tick
+        self.towers_built = 0
+        self.max_enemy_speed = 0.0
+
+        # Enemy grid is rebuilt lazily once per tick; towers only move on build/sell
+        self.enemy_grid = SpatialGrid(cell_size=60)
+        self.enemy_grid_tick = -1
+        # Enemies sorted by distance travelled, also rebuilt once per tick
+        self.progress_keys = []
+        self.progress_order = []
+        self.progress_tick = -1
+
+        # Optional NumPy store; self.enemies then holds its EnemyRef handles
+        self.store = None
+        if use_numpy:
+            if np is None:
+                print("numpy not installed. Using per-object enemies.")
+            else:
+                self.store = EnemyStore(level_data['path'])
+                self.enemies = self.store.refs
+        self.projectile_store = ProjectileStore(self.store) if self.store and not scheduled_hits else None
+        self.tower_grid = SpatialGrid(cell_size=75)
+
+        self.wave_active = False
+        # One cursor per spawning group: (tick, wave_index, group, enemyType, left, interval)
+        self.spawn_queue = []
+        self.next_wave_at = None # endless only
+        self.wave_clear_timer = 0
+
+        # Things that happened during the last step, for sound/visual feedback
+        self.events = []
+        # Optional FrameProfiler; None keeps step() free of timing calls
+        self.profiler = None
+
+    # --- PLAYER COMMANDS ---
+
+    def record(self, command, *args):
+        self.commands.append([self.tick, command, *args])
+
+    def start_wave(self):
+        if self.state != GameState.PLAYING or self.wave_active: return False
+
+        if self.wave_count is None or self.wave_index < self.wave_count:
+            self.wave_active = True
+            self.queue_wave(self.tick)
+            self.record('START')
+            return True
+        return False
+
+    def tower_at_spot(self, spot_idx):
+        return self.spot_towers[spot_idx]
+
+    def build_tower(self, t_type, spot_idx):
+        cost = TOWER_STATS[t_type]['cost']
+        if self.gold < cost or self.tower_at_spot(spot_idx):
+            return None
+        spot = self.level['buildSpots'][spot_idx]
+        self.gold -= cost
+        new_t = Tower(t_type, spot[0], spot[1], spot_idx)
+        self.towers_built += 1
+        new_t.seq = self.towers_built
+        self.update_coverage(new_t)
+        self.towers.append(new_t)
+        self.spot_towers[spot_idx] = new_t
+        self.tower_grid.rebuild(self.towers)
+        self.layout_version += 1
+        self.record('BUILD', t_type.name, spot_idx)
+        return new_t
+
+    def sell_tower(self, t):
+        if t not in self.towers: return False
+        self.gold += int(TOWER_STATS[t.type]['cost'] * 0.5)
+        self.towers.remove(t)
+        self.spot_towers[t.spot_idx] = None
+        t.wake_at = None # drops its queued wake-up
+        self.tower_grid.rebuild(self.towers)
+        self.layout_version += 1
+        self.record('SELL', t.spot_idx)
+        return True
+
+    def upgrade_cost(self, t):
+        return int(TOWER_STATS[t.type]['cost'] * (UPGRADE_COST_MULTIPLIER ** t.level))
+
+    def upgrade_tower(self, t):
+        cost = self.upgrade_cost(t)
+        if self.gold >= cost and t.level < 4:
+            self.gold -= cost
+            t.level += 1
+            self.update_coverage(t)
+            self.record('UPGRADE', t.spot_idx)
+            return True
+        return False
+
+    def buy_passive(self, t, pid):
+        p_data = next((p for p in TOWER_PASSIVES[t.type] if p['id'] == pid), None)
+        if p_data is None or t.has_passive(pid): return False
+        if self.gold >= p_data['cost']:
+            self.gold -= p_data['cost']
+            t.passives.append(pid)
+            self.update_coverage(t)
+            self.record('PASSIVE', t.spot_idx, pid)
+            return True
+        return False
+
+    def set_target_policy(self, t, policy):
+        if t not in self.towers or t.target_policy == policy: return False
+        t.target_policy = policy
+        self.record('TARGET', t.spot_idx, policy.name)
+        return True
+
+    def update_coverage(self, t):
+        geo = self.level.get('geometry')
+        spans = geo.coverage(t.spot_idx, t.get_range()) if geo and t.spot_idx is not None else None
+        t.coverage = spans if spans is not None else self.path_table.coverage(t.x, t.y, t.get_range())
+        self.wake_tower(t, self.tick) # its old prediction no longer holds
+
+    def spawn_enemy(self, e_type, wave_idx, distance=0.0):
+        enemy = Enemy(e_type, self.level['path'], wave_idx)
+        enemy.skill_ready_at = self.tick + 90
+        self.max_enemy_speed = max(self.max_enemy_speed, enemy.speed)
+        if distance > 0:
+            # Start part-way along the path (benchmarks, stress waves)
+            enemy.distance = distance
+            enemy.path_index = enemy.table.segment_at(distance)
+            enemy.x, enemy.y = enemy.table.position_at(distance)
+        if self.store:
+            enemy = self.store.add(enemy)
+        else:
+            self.enemies.append(enemy)
+        self.wake_towers_for(enemy)
+        return enemy
+
+    # --- TICK ---
+
+    def enemies_near(self, x, y, radius):
+        # Enemies only move at the end of a tick, so one rebuild serves every
+        # tower and splash query made during it
+        if self.enemy_grid_tick != self.tick:
+            if self.store:
+                n = self.store.n
+                self.enemy_grid.rebuild(self.enemies, self.store.x[:n].tolist(), self.store.y[:n].tolist())
+            else:
+                self.enemy_grid.rebuild(self.enemies)
+            self.enemy_grid_tick = self.tick
+        return self.enemy_grid.query(x, y, radius)
+
+    def enemy_at(self, x, y, radius):
+        """The live enemy closest to (x, y) within radius, or None."""
+        # One query a frame: the towers' grid is a tick stale by draw time and
+        # rebuilding it (or any index) costs more than a single pass
+        r2 = radius * radius
+        if self.store:
+            n = self.store.n
+            if n == 0: return None
+            d2 = (self.store.x[:n] - x) ** 2 + (self.store.y[:n] - y) ** 2
+            d2[self.store.hp[:n] <= 0] = np.inf
+            i = int(d2.argmin())
+            return self.enemies[i] if d2[i] <= r2 else None
+        best = None
+        for e in self.enemies:
+            d2 = (e.x - x) ** 2 + (e.y - y) ** 2
+            if d2 <= r2 and e.hp > 0:
+                best, r2 = e, d2
+        return best
+
+    def progress_index(self):
+        if self.progress_tick != self.tick:
+            if self.store:
+                n = self.store.n
+                order = np.argsort(self.store.distance[:n], kind='stable')
+                self.progress_keys = self.store.distance[order].tolist()
+                refs = self.enemies
+                self.progress_order = [refs[i] for i in order.tolist()]
+            else:
+                self.progress_order = sorted(self.enemies, key=lambda e: e.distance)
+                self.progress_keys = [e.distance for e in self.progress_order]
+            self.progress_tick = self.tick
+        return self.progress_keys, self.progress_order
+
+    def find_targets(self, t, count=1):
+        """Up to count enemies inside t's range, best first by its target policy.
+        Enemies sit exactly on the path, so its coverage ranges bisect straight
+        into the progress index with no distance checks."""
+        keys, order = self.progress_index()
+        spans = []
+        for d0, d1 in t.coverage:
+            lo, hi = bisect_left(keys, d0), bisect_right(keys, d1)
+            if lo < hi: spans.append((lo, hi))
+        if not spans: return []
+
+        policy = t.target_policy
+        if policy == TargetPolicy.FIRST:
+            idx = (i for lo, hi in reversed(spans) for i in range(hi - 1, lo - 1, -1))
+            return [order[i] for i in islice(idx, count)]
+        if policy == TargetPolicy.LAST:
+            idx = (i for lo, hi in spans for i in range(lo, hi))
+            return [order[i] for i in islice(idx, count)]
+        # Scans only the enemies in range; ties go to the one furthest along
+        in_range = [order[i] for lo, hi in reversed(spans) for i in range(hi - 1, lo - 1, -1)]
+        if policy == TargetPolicy.STRONGEST:
+            in_range.sort(key=lambda e: -e.hp)
+        else:
+            tx, ty = t.x, t.y
+            in_range.sort(key=lambda e: (e.x - tx)**2 + (e.y - ty)**2)
+        return in_range[:count]
+
+    def step(self):
+        self.events = []
+        if self.state != GameState.PLAYING:
+            return
+
+        self.expire_effects()
+        prof = self.profiler
+        if prof is None:
+            self.step_waves()
+            self.step_towers()
+            self.step_projectiles()
+            self.step_enemy_phase()
+        else:
+            perf = time.perf_counter
+            t0 = perf()
+            self.step_waves()
+            t1 = perf()
+            self.step_towers()
+            t2 = perf()
+            self.step_projectiles()
+            t3 = perf()
+            self.step_enemy_phase()
+            t4 = perf()
+            prof.add('wave_spawn', t1 - t0)
+            prof.add('targeting', t2 - t1)
+            prof.add('projectiles', t3 - t2)
+            prof.add('enemies', t4 - t3)
+
+        self.tick += 1
+
+    def expire_effects(self):
+        for when, kind, obj in self.effects.due(self.tick):
+            if kind == 'SLOW' and obj.frozen_until == when:
+                obj.frozen_factor = 1.0
+                # Speeding up can bring its arrival forward, so towers re-predict
+                if obj.hp > 0:
+                    self.wake_towers_for(obj)
+
+    def slow(self, e, duration, factor):
+        # Slow, stun and root share one timer; the latest hit overwrites it.
+        # A weaker slow replacing a root or stun speeds the enemy up, and towers
+        # that slept past it (predict_wake skips stopped enemies) must re-predict.
+        # A stronger one only delays arrivals: those towers just wake early.
+        sped_up = factor > e.frozen_factor
+        e.frozen_until = self.tick + duration
+        e.frozen_factor = factor
+        self.effects.add(e.frozen_until, 'SLOW', e)
+        if sped_up and e.hp > 0:
+            self.wake_towers_for(e)
+
+    def wave_groups(self, wave_index=None):
+        if wave_index is None: wave_index = self.wave_index
+        return wave_groups(wave_index + 1, self.level['difficulty'])
+
+    def queue_wave(self, start):
+        groups = self.wave_groups()
+        for g, (e_type, count, interval, delay) in enumerate(groups):
+            if count > 0:
+                heapq.heappush(self.spawn_queue, (start + delay, self.wave_index, g, e_type, count, interval))
+        if self.endless:
+            self.next_wave_at = start + max(ENDLESS_MIN_GAP, wave_length(groups) * 3 // 4)
+
+    def step_waves(self):
+        if self.wave_active:
+            queue = self.spawn_queue
+            if self.endless and self.tick >= self.next_wave_at:
+                # Surviving a wave pays out as the next one rolls in
+                self.gold += 100 + (self.wave_index * 25)
+                self.wave_index += 1
+                self.queue_wave(self.tick)
+            if queue:
+                while queue and queue[0][0] <= self.tick:
+                    tick, wave_index, g, e_type, left, interval = heapq.heappop(queue)
+                    self.spawn_enemy(e_type, wave_index)
+                    if left > 1:
+                        heapq.heappush(queue, (tick + interval, wave_index, g, e_type, left - 1, interval))
+            elif len(self.enemies) == 0 and not self.endless:
+                self.wave_active = False
+                self.gold += 100 + (self.wave_index * 25)
+                if self.wave_index == self.wave_count - 1:
+                    self.state = GameState.VICTORY
+                else:
+                    self.wave_index += 1
+                    self.wave_clear_timer = 180
+
+        if self.wave_clear_timer > 0:
+            self.wave_clear_timer -= 1
+
+    # --- TOWER WAKE-UPS ---
+
+    def wake_tower(self, t, tick):
+        tick = max(tick, t.ready_at)
+        if t.wake_at is None or tick < t.wake_at:
+            t.wake_at = tick
+            heapq.heappush(self.tower_wakes, (tick, t.seq, t))
+
+    def ticks_until_in_range(self, t, e):
+        """Lower bound on the ticks before e can enter t's coverage, or None.
+        Enemies never move more than speed * frozen_factor per tick."""
+        v = e.speed * e.frozen_factor
+        dist = e.distance
+        for d0, d1 in t.coverage:
+            if dist > d1: continue
+            if dist >= d0: return 0
+            return int((d0 - dist) / v) if v > 0 else None
+        return None
+
+    def wake_towers_for(self, e):
+        for t in self.towers:
+            m = self.ticks_until_in_range(t, e)
+            if m is not None:
+                self.wake_tower(t, self.tick + m)
+
+    def predict_wake(self, t):
+        """Earliest tick any current enemy could reach t, from the progress
+        index; None when nothing is coming."""
+        keys, order = self.progress_index()
+        vmax = self.max_enemy_speed
+        best = None
+        for d0, _ in t.coverage:
+            # Walk back from the span entry; stop once even the fastest enemy
+            # that far behind could not beat the best arrival found so far
+            for i in range(bisect_left(keys, d0) - 1, -1, -1):
+                gap = d0 - keys[i]
+                if best is not None and gap >= best * vmax: break
+                e = order[i]
+                v = e.speed * e.frozen_factor
+                if v > 0:
+                    m = int(gap / v)
+                    if best is None or m < best: best = m
+        return None if best is None else self.tick + max(1, best)
+
+    def step_towers(self):
+        wakes = self.tower_wakes
+        due = []
+        while wakes and wakes[0][0] <= self.tick:
+            when, _, t = heapq.heappop(wakes)
+            if t.wake_at == when:
+                t.wake_at = None
+                due.append(t)
+        if self.poll_towers:
+            due = [t for t in self.towers if t.ready_at <= self.tick]
+
+        for t in due:
+            if t.ready_at > self.tick:
+                self.wake_tower(t, t.ready_at) # hexed since it was queued
+                continue
+
+            stats = TOWER_STATS[t.type]
+            multi = t.has_passive('MULTI_SHOT')
+            targets = self.find_targets(t, 2 if multi else 1) if self.enemies else None
+
+            if targets:
+                target = targets[0]
+                dmg = stats['damage'] * t.level
+                if t.has_passive('CRIT') and self.rng.random() < 0.2:
+                    dmg *= 3
+
+                self.fire(t, target, dmg)
+
+                if multi and len(targets) > 1:
+                    self.fire(t, targets[1], dmg)
+
+                t.ready_at = self.tick + 1 + max(5, stats['cooldown'] - (t.level * 2))
+                self.wake_tower(t, t.ready_at)
+            elif not self.poll_towers:
+                wake = self.predict_wake(t) if self.enemies else None
+                if wake is not None:
+                    self.wake_tower(t, wake)
+
+    def fire(self, t, target, dmg):
+        p = self.projectile_pool.acquire(t.type, t.x, t.y, target, dmg, t.passives)
+        self.shots_fired += 1
+        self.events.append('FIRE')
+        if self.scheduled_hits:
+            # Lands on the tick a homing shot would reach a target standing still
+            dist = math.sqrt((target.x - t.x)**2 + (target.y - t.y)**2)
+            heapq.heappush(self.impacts, (self.tick + int(dist // p.speed), self.shots_fired, p))
+        else:
+            self.projectiles.append(p)
+            if self.projectile_store:
+                self.projectile_store.add(p)
+
+    def step_projectiles(self):
+        impacts = self.impacts
+        while impacts and impacts[0][0] <= self.tick:
+            p = heapq.heappop(impacts)[2]
+            self.resolve_hit(p)
+            self.projectile_pool.release(p)
+
+        projectiles = self.projectiles
+        if not projectiles: return
+        # Move every shot first, then resolve hits in firing order
+        if self.projectile_store:
+            hits = self.projectile_store.step(projectiles)
+        else:
+            hits = [p.update() for p in projectiles]
+
+        # Compact survivors in place (keeps firing order, no list copy or remove)
+        keep = []
+        w = 0
+        for p, hit in zip(projectiles, hits):
+            if hit:
+                self.resolve_hit(p)
+            alive = not hit and p.active
+            keep.append(alive)
+            if alive:
+                projectiles[w] = p
+                w += 1
+            else:
+                self.projectile_pool.release(p)
+        if w < len(projectiles):
+            del projectiles[w:]
+            if self.projectile_store:
+                self.projectile_store.compact(keep)
+
+    def resolve_hit(self, p):
+        target = p.target
+        if target.hp <= 0:
+            return # an earlier shot this tick already killed it
+        target.hp -= p.damage
+        if p.type == TowerType.ROCK:
+            self.events.append('ROCK_HIT')
+        if p.type == TowerType.SAP:
+            factor = 0.3 if 'PERMA_SLOW' in p.passives else 0.5
+            if 'ACID' in p.passives: target.poison_until = self.tick + 180
+            if 'ROOT' in p.passives and self.rng.random() < 0.1: factor = 0
+            self.slow(target, p.slow_duration, factor)
+        if p.stun_duration > 0:
+            self.slow(target, p.stun_duration, 0)
+        if p.type == TowerType.ROCK and 'EXECUTE' in p.passives and target.hp < target.max_hp * 0.2:
+            target.hp = -1
+        if p.is_splash:
+            for e, d2 in self.enemies_near(target.x, target.y, 50):
+                if e != target and d2 < 2500:
+                    e.hp -= p.damage * 0.5
+
+    def step_enemy_phase(self):
+        if self.store:
+            self.step_enemies_batched()
+        else:
+            self.step_enemies()
+
+    def shaman_cast(self, e):
+        closest = None
+        min_d2 = 150 * 150
+        free_at = self.tick + 1 # towers have already acted this tick
+        for t, d2 in self.tower_grid.query(e.x, e.y, 150):
+            if d2 < min_d2 and t.disabled_until <= free_at:
+                min_d2 = d2
+                closest = t
+        if closest:
+            self.events.append('HEX')
+            closest.disabled_until = free_at + 210
+            # The cooldown is frozen while hexed
+            closest.ready_at = max(closest.ready_at, free_at) + 210
+            if closest.wake_at is not None:
+                closest.wake_at = None
+                self.wake_tower(closest, closest.ready_at)
+            return True
+        return False
+
+    def step_enemies(self):
+        enemies = self.enemies
+        tick = self.tick
+        w = 0
+        for e in enemies:
+            if e.type == EnemyType.SHAMAN and e.skill_ready_at <= tick and self.shaman_cast(e):
+                e.skill_ready_at = tick + 301
+
+            if e.hp <= 0:
+                self.gold += ENEMY_BOUNTY[e.type]
+                continue
+
+            reached_end = e.update(tick)
+            if reached_end:
+                self.lives -= 1
+                if self.lives <= 0:
+                    self.state = GameState.GAME_OVER
+            else:
+                enemies[w] = e
+                w += 1
+        del enemies[w:]
+
+    def step_enemies_batched(self):
+        st = self.store
+        n = st.n
+        if n == 0: return
+
+        # Shaman skills run first and in list order, as in step_enemies()
+        shaman = st.is_shaman[:n]
+        if shaman.any():
+            ready_at = st.skill_ready_at[:n]
+            for i in np.flatnonzero(shaman & (ready_at <= self.tick)).tolist():
+                if self.shaman_cast(self.enemies[i]):
+                    ready_at[i] = self.tick + 301
+
+        gold, leaked = st.step(self.tick)
+        if st.remap is not None and self.projectile_store:
+            self.projectile_store.remap_targets(st.remap)
+        self.gold += gold
+        if leaked:
+            self.lives -= leaked
+            if self.lives <= 0:
+                self.state = GameState.GAME_OVER
+
+    def is_idle(self):
+        """True when nothing will change until the player acts."""
+        if self.wave_active or self.wave_clear_timer or self.enemies or self.projectiles or self.impacts:
+            return False
+        return all(t.ready_at <= self.tick for t in self.towers)
+
+    def state_hash(self):
+        """Short digest of everything that decides the outcome of a run."""
+        parts = (
+            self.tick, self.state.name, self.gold, self.lives, self.wave_index,
+            self.wave_active, sorted((t, w, g, e.name, n, i) for t, w, g, e, n, i in self.spawn_queue), self.next_wave_at,
+            [(t.type.name, t.spot_idx, t.level, sorted(t.passives), t.target_policy.name, t.ready_at, t.disabled_until) for t in self.towers],
+            # float() so node-snapped ints and NumPy floats hash alike
+            [(e.type.name, float(e.x), float(e.y), float(e.hp), int(e.path_index), int(e.frozen_until), int(e.poison_until)) for e in self.enemies],
+            [(p.type.name, p.x, p.y, p.damage) for p in self.projectiles],
+            [(tick, p.type.name, p.damage) for tick, _, p in sorted(self.impacts)],
+            self.rng.getstate(),
+        )
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:16]
+
+    def apply_command(self, cmd):
+        _, command, *args = cmd
+        if command == 'START':
+            return self.start_wave()
+        if command == 'BUILD':
+            return self.build_tower(TowerType[args[0]], args[1]) is not None
+        t = self.tower_at_spot(args[0])
+        if t is None:
+            return False
+        if command == 'SELL':
+            return self.sell_tower(t)
+        if command == 'UPGRADE':
+            return self.upgrade_tower(t)
+        if command == 'PASSIVE':
+            return self.buy_passive(t, args[1])
+        if command == 'TARGET':
+            return self.set_target_policy(t, TargetPolicy[args[1]])
+        raise ValueError(f"Unknown command {command!r}")
+
+    def recording(self):
+        return {
+            'version': 2,
+            'level': self.level['id'],
+            'seed': self.seed,
+            'scheduled_hits': self.scheduled_hits,
+            'endless': self.endless,
+            'commands': self.commands,
+            'final_tick': self.tick,
+            'state_hash': self.state_hash(),
+        }
+
+    def run(self, max_ticks=None, builder=None):
+        """Steps until the level is won or lost, starting each wave as soon as
+        the previous one is cleared. `builder(sim)` is called before every wave."""
+        built_for = None
+        while self.state == GameState.PLAYING:
+            if max_ticks is not None and self.tick >= max_ticks:
+                break
+            if not self.wave_active:
+                if builder: builder(self)
+                self.start_wave()
+            elif builder and self.wave_index != built_for:
+                # Endless waves never clear, so build as each one rolls in
+                builder(self)
+            built_for = self.wave_index
+            self.step()
+        return self.state
+
+def greedy_builder(sim):
+    # Fill free spots with Archers, then pour leftover gold into upgrades
+    for i in range(len(sim.level['buildSpots'])):
+        if sim.tower_at_spot(i) is None:
+            sim.build_tower(TowerType.ARCHER, i)
+    for t in sorted(sim.towers, key=lambda t: t.level):
+        sim.upgrade_tower(t)
+
+def mixed_builder(sim):
+    # Archer/Sap/Rock round-robin over the spots, then level everything evenly
+    for i in range(len(sim.level['buildSpots'])):
+        if sim.tower_at_spot(i) is None:
+            sim.build_tower(BUILD_CYCLE[i % len(BUILD_CYCLE)], i)
+    for t in sorted(sim.towers, key=lambda t: t.level):
+        sim.upgrade_tower(t)
+
+def rock_passive_builder(sim):
+    # Rocks everywhere, buying Meteor/Crusher before any upgrade
+    for i in range(len(sim.level['buildSpots'])):
+        if sim.tower_at_spot(i) is None:
+            sim.build_tower(TowerType.ROCK, i)
+    for t in sim.towers:
+        for pid in ('SPLASH', 'EXECUTE'):
+            sim.buy_passive(t, pid)
+    for t in sorted(sim.towers, key=lambda t: t.level):
+        sim.upgrade_tower(t)
+
+class ScriptedBuilder:
+    """Build order given as a list of commands, e.g. ["BUILD", "ROCK", 0],
+    ["UPGRADE", 0], ["PASSIVE", 0, "SPLASH"]. Before each wave it issues as
+    many as it can afford, in order; commands that can never succeed
+    (bad spot, owned passive, max level) are skipped."""
+    def __init__(self, steps):
+        self.steps = steps
+        self.pos = 0
+
+    def __call__(self, sim):
+        while self.pos < len(self.steps):
+            cmd = [sim.tick] + list(self.steps[self.pos])
+            cost = self.command_cost(sim, cmd)
+            if cost is not None and cost > sim.gold:
+                break # wait for more gold
+            if cost is not None:
+                sim.apply_command(cmd)
+            self.pos += 1
+
+    @staticmethod
+    def command_cost(sim, cmd):
+        _, command, *args = cmd
+        if command == 'START':
+            return None
+        spot_idx = args[1] if command == 'BUILD' else args[0]
+        if spot_idx >= len(sim.level['buildSpots']):
+            return None
+        t = sim.tower_at_spot(spot_idx)
+        if command == 'BUILD':
+            return None if t else TOWER_STATS[TowerType[args[0]]]['cost']
+        if t is None:
+            return None
+        if command == 'UPGRADE':
+            return sim.upgrade_cost(t) if t.level < 4 else None
+        if command == 'PASSIVE':
+            p_data = next((p for p in TOWER_PASSIVES[t.type] if p['id'] == args[1]), None)
+            return None if p_data is None or t.has_passive(args[1]) else p_data['cost']
+        return 0 # SELL, TARGET
+
+def replay_recording(rec, use_numpy=False):
+    """Re-runs a recording headless. Returns (sim, hash_matches)."""
+    level = next(l for l in LEVELS if l['id'] == rec['level'])
+    sim = Simulation(level, use_numpy=use_numpy, seed=rec['seed'], scheduled_hits=rec.get('scheduled_hits', False),
+                     endless=rec.get('endless', False))
+    commands = rec['commands']
+    i = 0
+    while True:
+        while i < len(commands) and commands[i][0] <= sim.tick:
+            sim.apply_command(commands[i])
+            i += 1
+        if sim.tick >= rec['final_tick'] or sim.state != GameState.PLAYING:
+            break
+        sim.step()
+    return sim, sim.state_hash() == rec['state_hash']
+
+def run_replay(path, use_numpy=False):
+    with open(path) as f:
+        rec = json.load(f)
+    t0 = time.perf_counter()
+    sim, ok = replay_recording(rec, use_numpy=use_numpy)
+    elapsed = time.perf_counter() - t0
+    print(f"Replayed {len(rec['commands'])} commands over {sim.tick} ticks in {elapsed:.2f}s: "
+          f"{sim.state.name} at wave {sim.wave_index + 1}, lives {sim.lives}, gold {sim.gold}")
+    print(f"State hash {sim.state_hash()} {'matches' if ok else 'DOES NOT MATCH'} recorded {rec['state_hash']}")
+    return ok
+
+def check_wake_parity(levels=LEVELS, seeds=range(5), use_numpy=False, max_ticks=20000):
+    """Plays seeded random games with the tower wake queue and with polling
+    side by side, leaning on Sap roots and Rock stuns since those move the
+    shared slow timer both ways. Returns True when every pair matches."""
+    ok = True
+    for level in levels:
+        for seed in seeds:
+            sim = Simulation(level, use_numpy=use_numpy, seed=seed)
+            ref = Simulation(level, use_numpy=use_numpy, seed=seed, poll_towers=True)
+            rng = random.Random(seed)
+            spots = len(level['buildSpots'])
+            diverged = None
+            while sim.state == GameState.PLAYING and sim.tick < max_ticks:
+                n = len(sim.commands)
+                if rng.random() < 0.02:
+                    i = rng.randrange(spots)
+                    t = sim.tower_at_spot(i)
+                    if t is None:
+                        sim.build_tower(rng.choice((TowerType.SAP, TowerType.SAP, TowerType.ROCK, TowerType.ARCHER)), i)
+                    elif t.type == TowerType.SAP and not t.has_passive('ROOT'):
+                        sim.buy_passive(t, 'ROOT')
+                    elif t.type == TowerType.ROCK and not t.has_passive('STUN'):
+                        sim.buy_passive(t, 'STUN')
+                    else:
+                        sim.upgrade_tower(t)
+                if not sim.wave_active and rng.random() < 0.02:
+                    sim.start_wave()
+                for cmd in sim.commands[n:]:
+                    ref.apply_command(cmd)
+                sim.step()
+                ref.step()
+                if sim.shots_fired != ref.shots_fired:
+                    diverged = sim.tick
+                    break
+            if diverged is None and sim.state_hash() != ref.state_hash():
+                diverged = sim.tick
+            ok = ok and diverged is None
+            print(f"Level {level['id']} seed {seed}: {sim.tick} ticks, {sim.shots_fired} shots, "
+                  f"{'match' if diverged is None else f'DIVERGED by tick {diverged}'}")
+    return ok
+
+def run_headless(levels=LEVELS, use_numpy=False, scheduled_hits=False, endless=False):
+    for level in levels:
+        sim = Simulation(level, use_numpy=use_numpy, scheduled_hits=scheduled_hits, endless=endless)
+        t0 = time.perf_counter()
+        result = sim.run(builder=greedy_builder)
+        elapsed = time.perf_counter() - t0
+        pool = sim.projectile_pool.stats()
+        print(f"Level {level['id']} ({level['name']}): {result.name} at wave {sim.wave_index + 1}, "
+              f"lives {sim.lives}, gold {sim.gold}, {sim.tick} ticks in {elapsed:.2f}s "
+              f"({sim.tick / max(elapsed, 1e-9):.0f} ticks/s), "
+              f"projectile pool high-water {pool['high_water']} ({pool['allocated']} allocated, {pool['reused']} reused)")
+
+# --- BALANCE SWEEPS ---
+
+BUILD_CYCLE = [TowerType.ARCHER, TowerType.SAP, TowerType.ROCK]
+
+BUILD_ORDERS = {
+    'greedy_archer': greedy_builder,
+    'mixed': mixed_builder,
+    'rock_passives': rock_passive_builder,
+}
+
+_BALANCE_DEFAULTS = {
+    'TOWER_STATS': copy.deepcopy(TOWER_STATS),
+    'TOWER_PASSIVES': copy.deepcopy(TOWER_PASSIVES),
+    'UPGRADE_COST_MULTIPLIER': UPGRADE_COST_MULTIPLIER,
+    'DIFFICULTY': {level['id']: level['difficulty'] for level in LEVELS},
+}
+
+def apply_balance_overrides(overrides):
+    """Resets the balance tables to their shipped values, then applies
+    dotted-path overrides such as {"TOWER_STATS.ARCHER.damage": 10,
+    "TOWER_PASSIVES.ROCK.SPLASH.cost": 150, "UPGRADE_COST_MULTIPLIER": 1.3,
+    "DIFFICULTY.2": 1.5}. Tables are edited in place so every reader sees it."""
+    global UPGRADE_COST_MULTIPLIER
+    for t_type, stats in _BALANCE_DEFAULTS['TOWER_STATS'].items():
+        TOWER_STATS[t_type].update(stats)
+    for t_type, passives in _BALANCE_DEFAULTS['TOWER_PASSIVES'].items():
+        for current, default in zip(TOWER_PASSIVES[t_type], passives):
+            current.update(default)
+    UPGRADE_COST_MULTIPLIER = _BALANCE_DEFAULTS['UPGRADE_COST_MULTIPLIER']
+    difficulty = dict(_BALANCE_DEFAULTS['DIFFICULTY'])
+
+    for path, value in overrides.items():
+        head, *rest = path.split('.')
+        if head == 'UPGRADE_COST_MULTIPLIER':
+            UPGRADE_COST_MULTIPLIER = value
+        elif head == 'TOWER_STATS':
+            TOWER_STATS[TowerType[rest[0]]][rest[1]] = value
+        elif head == 'TOWER_PASSIVES':
+            entry = next(p for p in TOWER_PASSIVES[TowerType[rest[0]]] if p['id'] == rest[1])
+            entry[rest[2]] = value
+        elif head == 'DIFFICULTY':
+            difficulty[int(rest[0])] = value
+        else:
+            raise KeyError(f"Unknown balance parameter {path!r}")
+
+    for level in LEVELS:
+        level['difficulty'] = difficulty[level['id']]
+
+def play_sweep_game(task):
+    overrides, order, level_id, seed, use_numpy, scheduled_hits, max_ticks = task
+    apply_balance_overrides(overrides)
+    level = next(l for l in LEVELS if l['id'] == level_id)
+    builder = BUILD_ORDERS[order] if isinstance(order, str) else ScriptedBuilder(order)
+    sim = Simulation(level, use_numpy=use_numpy, seed=seed, scheduled_hits=scheduled_hits)
+    sim.run(max_ticks=max_ticks, builder=builder)
+    return {
+        'won': sim.state == GameState.VICTORY,
+        'lives_lost': level['startLives'] - max(0, sim.lives),
+        'gold': sim.gold,
+        'wave': sim.wave_index + 1,
+    }
+
+SWEEP_DEFAULT_SPEC = {
+    'params': {
+        'TOWER_STATS.ARCHER.damage': [8, 10],
+        'UPGRADE_COST_MULTIPLIER': [1.3, 1.5],
+    },
+    'build_orders': ['greedy_archer', 'mixed'],
+    'levels': [1, 2, 3],
+    'seeds': 4,
+    'max_ticks': 200000,
+}
+
+def run_sweep(spec, workers=None, use_numpy=False, scheduled_hits=False):
+    """Plays every (override combination x build order x level x seed) in a
+    process pool and returns one aggregated row per configuration."""
+    import itertools
+    import multiprocessing
+
+    params = spec.get('params', {})
+    keys = sorted(params)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(params[k] for k in keys))]
+    orders = spec.get('build_orders', ['greedy_archer'])
+    levels = spec.get('levels', [l['id'] for l in LEVELS])
+    seeds = range(spec.get('seeds', 1))
+    max_ticks = spec.get('max_ticks', 200000)
+
+    tasks, labels = [], []
+    for ci, overrides in enumerate(combos):
+        for oi, order in enumerate(orders):
+            for level_id in levels:
+                for seed in seeds:
+                    tasks.append((overrides, order, level_id, seed, use_numpy, scheduled_hits, max_ticks))
+                    labels.append((ci, oi, level_id))
+
+    t0 = time.perf_counter()
+    with multiprocessing.Pool(processes=workers) as pool:
+        results = pool.map(play_sweep_game, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1))))
+    elapsed = time.perf_counter() - t0
+
+    groups = {}
+    for label, res in zip(labels, results):
+        groups.setdefault(label, []).append(res)
+    rows = []
+    for (ci, oi, level_id), games in groups.items():
+        order = orders[oi]
+        rows.append({
+            'config': ", ".join(f"{k}={v}" for k, v in combos[ci].items()) or "defaults",
+            'build_order': order if isinstance(order, str) else f"script#{oi}",
+            'level': level_id,
+            'games': len(games),
+            'win_rate': sum(g['won'] for g in games) / len(games),
+            'lives_lost': sum(g['lives_lost'] for g in games) / len(games),
+            'gold_left': sum(g['gold'] for g in games) / len(games),
+            'wave_reached': sum(g['wave'] for g in games) / len(games),
+        })
+    print(f"{len(tasks)} games in {elapsed:.1f}s ({len(tasks) / max(elapsed, 1e-9):.1f} games/s)")
+    return rows
+
+def print_sweep_table(rows):
+    cfg_w = max([len("CONFIG")] + [len(r['config']) for r in rows])
+    ord_w = max([len("ORDER")] + [len(r['build_order']) for r in rows])
+    print(f"{'CONFIG':<{cfg_w}}  {'ORDER':<{ord_w}}  LVL  GAMES   WIN%  LIVES-  GOLD    WAVE")
+    for r in rows:
+        print(f"{r['config']:<{cfg_w}}  {r['build_order']:<{ord_w}}  {r['level']:>3}  {r['games']:>5}  "
+              f"{r['win_rate'] * 100:5.1f}  {r['lives_lost']:6.1f}  {r['gold_left']:6.0f}  {r['wave_reached']:5.1f}")
+
+# --- ASSET LOADING ---
+
+SFX_ARROW_FILE = "burning-arrow-05-85092.mp3"
+PCM_MAGIC = b'PCM1'
+
+def startup_ms():
+    return (time.perf_counter() - STARTUP_T0) * 1000
+
+def load_pcm_cached(pcm_path, source_key, build):
+    """Loads a Sound from a .pcm cache file, or calls build() and writes its
+    samples there. The cache is tied to the mixer format and source_key.
+    Returns (Sound, cache_hit)."""
+    freq, size, channels = pygame.mixer.get_init()
+    key = struct.pack('<4siii', PCM_MAGIC, freq, size, channels) + source_key
+    try:
+        with open(pcm_path, 'rb') as f:
+            data = f.read()
+        if data[:len(key)] == key:
+            return pygame.mixer.Sound(buffer=memoryview(data)[len(key):]), True
+    except OSError:
+        pass
+
+    sound = build()
+    try:
+        tmp = f"{pcm_path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(key)
+            f.write(sound.get_raw())
+        os.replace(tmp, pcm_path)
+    except OSError:
+        pass
+    return sound, False
+
+def load_sound_cached(path):
+    """Loads a sound file, keeping its decoded samples in a .pcm file next to
+    it, keyed by the source's size and mtime. Returns (Sound, cache_hit)."""
+    st = os.stat(path)
+    return load_pcm_cached(os.path.splitext(path)[0] + '.pcm', struct.pack('<qq', st.st_size, st.st_mtime_ns),
+                           lambda: pygame.mixer.Sound(path))
+
+class AssetLoader:
+    """Runs named loading steps on a worker thread and times each one.
+
+    Steps may build Surfaces, Fonts and Sounds but must not touch the
+    display. The main thread keeps drawing the loading screen meanwhile,
+    blitting only surfaces made before start() (no font rendering).
+    """
+    def __init__(self, steps):
+        self.steps = steps
+        self.timings = {} # step name -> ms
+        self.done = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.work, name="asset-loader", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def work(self):
+        try:
+            for name, step in self.steps:
+                t0 = time.perf_counter()
+                step()
+                self.timings[name] = (time.perf_counter() - t0) * 1000
+                self.done += 1
+        except Exception as e:
+            self.error = e
+
+    def finish(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+def print_startup_report(report, path=None):
+    phases = ", ".join(f"{k} {v:.0f}ms" for k, v in report['phases_ms'].items())
+    assets = ", ".join(f"{k} {v:.0f}ms" for k, v in report['assets_ms'].items())
+    print(f"Startup: {phases}")
+    print(f"Assets ({'warm' if report['audio_cache_hit'] else 'cold'} audio cache): {assets}")
+    if path:
+        # One JSON line per launch so runs can be tracked over time
+        with open(path, 'a') as f:
+            f.write(json.dumps(report) + "\n")
+
+# --- AUDIO ---
+
+def synth_sound(freq, ms, volume=1.0, end_freq=None, noise=0.0):
+    """A short decaying tone (optionally swept and mixed with noise) in the
+    mixer's format, for effects that have no sample file."""
+    rate, size, channels = pygame.mixer.get_init()
+    n = rate * ms // 1000
+    end_freq = end_freq or freq
+    rng = random.Random(freq)
+    samples = array('h')
+    phase = 0.0
+    for i in range(n):
+        k = i / n
+        phase += 2 * math.pi * (freq + (end_freq - freq) * k) / rate
+        v = (1 - noise) * math.sin(phase) + noise * (rng.random() * 2 - 1)
+        samples.extend([int(v * (1 - k) ** 2 * volume * 32767)] * channels)
+    return pygame.mixer.Sound(buffer=samples.tobytes())
+
+def synth_sound_cached(name, *args, **kwargs):
+    """synth_sound() through the .pcm cache (sfx-<name>.pcm), keyed by its
+    arguments; the per-sample loop is too slow to run on every launch.
+    Returns (Sound, cache_hit)."""
+    params = hashlib.sha256(repr((args, sorted(kwargs.items()))).encode()).digest()[:16]
+    return load_pcm_cached(f"sfx-{name}.pcm", params, lambda: synth_sound(*args, **kwargs))
+
+class SfxMixer:
+    """Plays effects through a fixed pool of mixer channels.
+
+    Each sound has a voice cap, a priority and a merge window: a retrigger
+    inside the window is folded into the voice already playing, and a
+    trigger with no free channel may only take one from a lower-priority
+    sound. Otherwise it is dropped.
+    """
+    def __init__(self, channels=8):
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.owner = [None] * channels # (priority, started_ms, name) of the last play
+        self.sounds = {} # name -> (Sound, max_voices, priority, merge_ms)
+        self.last_play = {}
+        self.played = self.merged = self.dropped = 0
+
+    def add(self, name, sound, max_voices=2, priority=0, merge_ms=50):
+        self.sounds[name] = (sound, max_voices, priority, merge_ms)
+
+    def trigger(self, name, now_ms):
+        entry = self.sounds.get(name)
+        if entry is None: return
+        sound, max_voices, priority, merge_ms = entry
+        if now_ms - self.last_play.get(name, -merge_ms) < merge_ms:
+            self.merged += 1
+            return
+
+        free = steal = None
+        voices = 0
+        for i, ch in enumerate(self.channels):
+            if not ch.get_busy():
+                if free is None: free = i
+            elif self.owner[i][2] == name:
+                voices += 1
+            elif self.owner[i][0] < priority and (steal is None or self.owner[i] < self.owner[steal]):
+                steal = i # lowest priority, then oldest
+        i = free if free is not None else steal
+        if voices >= max_voices or i is None:
+            self.dropped += 1
+            return
+        self.channels[i].play(sound)
+        self.owner[i] = (priority, now_ms, name)
+        self.last_play[name] = now_ms
+        self.played += 1
+
+def display_refresh_rate():
+    """Refresh rate of the primary display in Hz, or None if unknown."""
+    # Only pygame-ce can report it; on plain pygame 2.x frame_cap() goes by vsync
+    query = getattr(pygame.display, 'get_desktop_refresh_rates', None)
+    if query is None: return None
+    try:
+        rates = query()
+    except pygame.error:
+        return None
+    return rates[0] if rates and rates[0] > 0 else None
+
 # --- MAIN GAME CLASS ---
 
 class Game:
     def __init__(self):
         pygame.init()
         pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
-        
-        # --- LOAD AUDIO ---
-        self.sfx_arrow = None
-        try:
-            self.sfx_arrow = pygame.mixer.Sound("burning-arrow-05-85092.mp3")
-            self.sfx_arrow.set_volume(0.3)
-        except:
-            print("Audio file 'burning-arrow-05-85092.mp3' not found. Sound disabled.")
+        self.startup = {'init': startup_ms()}
+        self.sfx = None # SfxMixer, set up by the asset loader
+        self.audio_cache_hit = False
 
         icon_surface = pygame.Surface((32, 32))
         icon_surface.fill(COLOR_BLACK)
@@ -479,55 +2429,126 @@ class Game:
         self.current_h = SCREEN_HEIGHT
         self.is_fullscreen = False
         
-        self.screen = pygame.display.set_mode((self.current_w, self.current_h), pygame.RESIZABLE)
+        self.render_fps = None # --fps; None follows the display's refresh rate
+        self.set_display_mode((self.current_w, self.current_h), pygame.RESIZABLE)
         pygame.display.set_caption("Monochrome TD")
         self.clock = pygame.time.Clock()
-        
+        self.startup['window'] = startup_ms()
+
+        # Fonts, sound and sprites load in the background behind a loading screen
+        self.loader = AssetLoader([
+            ('audio', self.load_audio),
+            ('fonts', self.load_fonts),
+            ('sprites', lambda: get_sprite_atlas(self.render_scale, convert=False)),
+        ])
         self.recalculate_scaling()
-
-        self.font_xl = pygame.font.SysFont('Consolas', 80, bold=True)
-        self.font_large = pygame.font.SysFont('Consolas', 50, bold=True)
-        self.font_med = pygame.font.SysFont('Consolas', 32, bold=True)
-        self.font_small = pygame.font.SysFont('Consolas', 22)
-        self.font_tiny = pygame.font.SysFont('Arial', 16, bold=True)
+        self.text_cache = TextCache()
+        # Rendered before the worker starts: FreeType is not thread-safe and
+        # the worker opens the game fonts while the loading screen is up
+        self.loading_text = pygame.font.Font(None, 36).render("LOADING...", True, COLOR_WHITE) # bundled font: no system font scan
+        self.loader.start()
+        self.exit_after_startup = False # --startup-report: quit after the first menu frame
 
         self.state = GameState.MENU
         self.current_level = None
-        self.lives = 0
-        self.gold = 0
-        self.wave_index = 0
+        self.sim = None
+        self.game_speed = 1
+        self.sim_accumulator = 0.0
+        self.prev_pos = {} # entity -> (x, y) one tick before the latest, for interpolation
+        self.profiler = None # FrameProfiler while the F3 overlay is on
         self.completed_levels = set()
+        self.endless_mode = False
+        self.level_page = 0
         self.menu_quit_confirm = False # Toggle for quit confirmation
         
-        self.towers = []
-        self.enemies = []
-        self.projectiles = []
-        
-        self.wave_active = False
-        self.wave_timer = 0
-        self.spawned_count = 0
-        self.wave_clear_timer = 0
-        
         self.selected_spot_idx = None 
         self.selected_tower = None 
         self.tooltip = None 
         self.ui_rects = {} 
+        self.hover_regions = [] # (rect, partial_ok) for widgets that change look on hover
+        # Tower picking tree, rebuilt when the layout changes
+        self.tower_tree = None
+        self.tower_tree_key = None
+        self.needs_redraw = True
+        self.window_hidden = False
+
+    def load_audio(self):
+        try:
+            arrow, self.audio_cache_hit = load_sound_cached(SFX_ARROW_FILE)
+        except (OSError, pygame.error):
+            print(f"Audio file '{SFX_ARROW_FILE}' not found. Sound disabled.")
+            return
+        arrow.set_volume(0.3)
+        sfx = SfxMixer()
+        # Shots are constant on a full board: few voices, merged per frame or two.
+        # Rock hits and hexes are rarer and worth hearing, so they win channels.
+        sfx.add('FIRE', arrow, max_voices=3, priority=0, merge_ms=40)
+        rock_hit, rock_hit_cached = synth_sound_cached('rock-hit', 70, 180, 0.5, end_freq=40, noise=0.4)
+        hex_tone, hex_cached = synth_sound_cached('hex', 900, 300, 0.25, end_freq=300)
+        self.audio_cache_hit = self.audio_cache_hit and rock_hit_cached and hex_cached
+        sfx.add('ROCK_HIT', rock_hit, max_voices=2, priority=1, merge_ms=60)
+        sfx.add('HEX', hex_tone, max_voices=1, priority=2, merge_ms=100)
+        self.sfx = sfx
+
+    def finish_loading(self):
+        """Waits for the asset loader and installs what it produced."""
+        if self.loader is None: return
+        self.loader.finish()
+        self.generate_sprites()
+        self.startup['assets'] = startup_ms()
+        self.loader_timings = self.loader.timings
+        self.loader = None
+
+    def show_loading_screen(self):
+        total = len(self.loader.steps)
+        while self.loader.thread.is_alive():
+            # Only QUIT is taken; everything else waits for the main loop
+            if pygame.event.get(pygame.QUIT):
+                pygame.quit()
+                sys.exit()
+            self.screen.fill(COLOR_BLACK)
+            txt = self.loading_text
+            self.screen.blit(txt, txt.get_rect(center=(self.current_w//2, self.current_h//2 - 30)))
+            bar = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 10, 300, 16)
+            pygame.draw.rect(self.screen, COLOR_GRAY, bar, 1)
+            pygame.draw.rect(self.screen, COLOR_WHITE, (bar.x + 2, bar.y + 2, (bar.w - 4) * self.loader.done // total, bar.h - 4))
+            pygame.display.flip()
+            self.startup.setdefault('first_frame', startup_ms())
+            self.loader.thread.join(1 / 30)
+        self.clock.tick() # loading time is not game time
+        self.finish_loading()
+
+    def startup_report(self):
+        return {
+            'timestamp': time.time(),
+            'audio_cache_hit': self.audio_cache_hit,
+            'phases_ms': self.startup,
+            'assets_ms': self.loader_timings,
+        }
+
+    def load_fonts(self):
+        self.font_xl = pygame.font.SysFont('Consolas', 80, bold=True)
+        self.font_large = pygame.font.SysFont('Consolas', 50, bold=True)
+        self.font_med = pygame.font.SysFont('Consolas', 32, bold=True)
+        self.font_small = pygame.font.SysFont('Consolas', 22)
+        self.font_tiny = pygame.font.SysFont('Arial', 16, bold=True)
+        # Cached glyphs belong to the old Font objects
+        self.text_cache.clear()
 
     def recalculate_scaling(self):
         self.render_scale = self.current_h / LOGICAL_HEIGHT
         self.game_area_width = LOGICAL_WIDTH * self.render_scale
         self.offset_x = (self.current_w - self.game_area_width) // 2
         self.offset_y = 0
-        self.generate_sprites()
+        if self.loader is None: # otherwise finish_loading() picks up the new scale
+            self.generate_sprites()
+        self.static_layer = None
+        self.static_layer_key = None
         
     def generate_sprites(self):
-        self.sprites = {}
-        for k, v in SPRITE_DATA.items():
-            self.sprites[k] = generate_enhanced_sprite(v, self.render_scale)
-            self.sprites[f"{k}_SLOW"] = self.sprites[k] 
-            self.sprites[f"{k}_DISABLED"] = generate_enhanced_sprite(v, self.render_scale) 
-            self.sprites[f"{k}_BUILD"] = self.sprites[k]
-            self.sprites[f"{k}_SELECTED"] = self.sprites[k]
+        self.sprites = get_sprite_atlas(self.render_scale)
+        self.sprite_anchors = {k: (spr, spr.get_width() // 2, spr.get_height() // 2) for k, spr in self.sprites.items()}
+        self.fx = get_fx_sprites(self.render_scale)
 
     def to_screen_coords(self, lx, ly):
         return (lx * self.render_scale) + self.offset_x, (ly * self.render_scale) + self.offset_y
@@ -535,38 +2556,71 @@ class Game:
     def to_logical_coords(self, sx, sy):
         return (sx - self.offset_x) / self.render_scale, (sy - self.offset_y) / self.render_scale
 
+    def set_display_mode(self, size, flags):
+        # SDL only honours vsync through SCALED's renderer. The surface is kept
+        # 1:1 with the window, so resizes still re-lay out instead of stretching.
+        if flags & pygame.FULLSCREEN and size == (0, 0):
+            size = pygame.display.get_desktop_sizes()[0] # SCALED needs a real size
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore') # "no fast renderer" on headless drivers
+                self.screen = pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+                window = pygame.display.get_window_size()
+                if window != self.screen.get_size():
+                    # SCALED blew a small window up to fit the desktop; take that size
+                    self.screen = pygame.display.set_mode(window, flags | pygame.SCALED, vsync=1)
+            # Without a renderer (headless drivers) SCALED is dropped and so is vsync
+            self.vsync = bool(self.screen.get_flags() & pygame.SCALED)
+        except pygame.error: # the driver refused vsync
+            self.screen = pygame.display.set_mode(size, flags)
+            self.vsync = False
+        self.current_w, self.current_h = self.screen.get_size()
+        self.refresh_rate = display_refresh_rate() # fullscreen may switch modes
+
+    def frame_cap(self):
+        if self.render_fps: return self.render_fps
+        if self.refresh_rate: return min(self.refresh_rate, RENDER_FPS_CAP)
+        # flip() already waits for the display; the cap only bounds it
+        return RENDER_FPS_CAP if self.vsync else FPS
+
     def toggle_fullscreen(self):
         self.is_fullscreen = not self.is_fullscreen
         if self.is_fullscreen:
-            self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+            self.set_display_mode((0, 0), pygame.FULLSCREEN)
         else:
-            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
-        self.current_w, self.current_h = self.screen.get_size()
+            self.set_display_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
         self.recalculate_scaling()
 
     def reset_game(self, level_data):
         self.current_level = level_data
-        self.lives = level_data['startLives']
-        self.gold = level_data['startGold']
-        self.wave_index = 0
-        self.towers = []
-        self.enemies = []
-        self.projectiles = []
-        self.wave_active = False
-        self.wave_timer = 0
-        self.spawned_count = 0
+        self.sim = Simulation(level_data, endless=self.endless_mode)
+        self.sim.profiler = self.profiler
+        self.sim_accumulator = 0.0
+        self.prev_pos = {}
+        self.static_layer_key = None
         self.selected_spot_idx = None
         self.selected_tower = None
         self.state = GameState.PLAYING
-        self.wave_clear_timer = 0
 
     def start_wave(self):
-        if not self.current_level: return
-
-        if self.wave_index < len(self.current_level['waves']):
-            self.wave_active = True
-            self.spawned_count = 0
-            self.wave_timer = 0
+        if not self.sim: return
+        self.sim.start_wave()
+
+    def level_select_layout(self):
+        """Level cards on the current page and the page arrows that apply."""
+        w, h = 300, 200
+        gap = 50
+        start_x = (self.current_w - (3*w + 2*gap)) // 2
+        start_y = self.current_h // 2 - 50
+        first = self.level_page * LEVELS_PER_PAGE
+        cards = [(level, pygame.Rect(start_x + i*(w+gap), start_y, w, h))
+                 for i, level in enumerate(LEVELS[first:first + LEVELS_PER_PAGE])]
+        page_rects = {}
+        if first > 0:
+            page_rects["PREV"] = pygame.Rect(start_x - 70, start_y + h//2 - 30, 40, 60)
+        if first + LEVELS_PER_PAGE < len(LEVELS):
+            page_rects["NEXT"] = pygame.Rect(start_x + 3*w + 2*gap + 30, start_y + h//2 - 30, 40, 60)
+        return cards, page_rects
 
     def handle_click(self, pos):
         if not self.current_level: return
@@ -577,163 +2631,197 @@ class Game:
             self.selected_tower = None
             return
 
-        clicked_spot = False
-        for i, spot in enumerate(self.current_level['buildSpots']):
-            if abs(spot[0] - lx) < 20 and abs(spot[1] - ly) < 20:
-                occupied = None
-                for t in self.towers:
-                    if t is None: continue
-                    if abs(t.x - spot[0]) < 5 and abs(t.y - spot[1]) < 5:
-                        occupied = t
-                        break
-                
-                if occupied:
-                    self.selected_tower = occupied
-                    self.selected_spot_idx = None
-                else:
-                    self.selected_spot_idx = i
-                    self.selected_tower = None
-                clicked_spot = True
-                break
-        
-        if not clicked_spot:
+        occupied = self.pick_tower(lx, ly)
+        i = None if occupied else self.current_level['geometry'].spot_at(lx, ly)
+        if occupied is None and i is not None:
+            occupied = self.sim.tower_at_spot(i)
+
+        if occupied:
+            self.selected_tower = occupied
+            self.selected_spot_idx = None
+        elif i is not None:
+            self.selected_spot_idx = i
+            self.selected_tower = None
+        else:
              self.selected_spot_idx = None
              self.selected_tower = None
 
-    def update(self):
-        if self.state == GameState.PLAYING and self.current_level:
-            wave_data = self.current_level['waves'][self.wave_index]
-            
-            if self.wave_active:
-                if self.spawned_count < wave_data['count']:
-                    if self.wave_timer % wave_data['interval'] == 0:
-                        self.enemies.append(Enemy(wave_data['enemyType'], self.current_level['path'], self.wave_index))
-                        self.spawned_count += 1
-                    self.wave_timer += 1
-                elif len(self.enemies) == 0:
-                    self.wave_active = False
-                    self.gold += 100 + (self.wave_index * 25)
-                    if self.wave_index == len(self.current_level['waves']) - 1:
-                        self.completed_levels.add(self.current_level['id'])
-                        self.state = GameState.VICTORY
-                    else:
-                        self.wave_index += 1
-                        self.wave_clear_timer = 180 
-
-            if self.wave_clear_timer > 0:
-                self.wave_clear_timer -= 1
+    def pick_tower(self, lx, ly):
+        key = (self.sim, self.sim.layout_version)
+        if self.tower_tree_key != key:
+            self.tower_tree = QuadTree.build(self.sim.towers)
+            self.tower_tree_key = key
+        return self.tower_tree.nearest(lx, ly, SPOT_HIT_SIZE)
+
+    def pick_enemy(self, lx, ly):
+        return self.sim.enemy_at(lx, ly, ENEMY_PICK_RADIUS)
+
+    def enemy_tooltip(self, e):
+        tick = self.sim.tick
+        status = []
+        if e.frozen_until > tick:
+            status.append(f"{'STUNNED' if e.frozen_factor == 0 else 'SLOWED'} {(e.frozen_until - tick) / 60:.1f}s")
+        if e.poison_until > tick:
+            status.append(f"POISONED {(e.poison_until - tick) / 60:.1f}s")
+        return (e.type.name, f"HP {math.ceil(e.hp)}/{math.ceil(e.max_hp)}", "  ".join(status) or "NO EFFECTS",
+                f"Bounty: {ENEMY_BOUNTY[e.type]}")
 
-            fired_this_frame = False
-
-            for t in self.towers:
-                if t is None: continue
-
-                if t.disabled_timer > 0:
-                    t.disabled_timer -= 1
-                    continue
-                
-                if t.cooldown_timer > 0:
-                    t.cooldown_timer -= 1
-                else:
-                    stats = TOWER_STATS[t.type]
-                    rng = stats['range'] * (1 + (t.level - 1) * 0.2)
-                    if t.has_passive('SNIPER'): rng *= 1.5
-                    
-                    target = None
-                    for e in self.enemies:
-                        if get_distance((t.x, t.y), (e.x, e.y)) <= rng:
-                            target = e
-                            break
-                    
-                    if target:
-                        dmg = stats['damage'] * t.level
-                        if t.has_passive('CRIT') and (pygame.time.get_ticks() % 5 == 0): 
-                            dmg *= 3
-                        
-                        self.projectiles.append(Projectile(t.type, t.x, t.y, target, dmg, t.passives))
-                        fired_this_frame = True 
-                        
-                        if t.has_passive('MULTI_SHOT'):
-                            for e in self.enemies:
-                                if e != target and get_distance((t.x, t.y), (e.x, e.y)) <= rng:
-                                    self.projectiles.append(Projectile(t.type, t.x, t.y, e, dmg, t.passives))
-                                    break
-                        
-                        t.cooldown_timer = max(5, stats['cooldown'] - (t.level * 2))
-
-            if fired_this_frame and self.sfx_arrow:
-                self.sfx_arrow.play()
-
-            for p in self.projectiles[:]:
-                hit = p.update()
-                if hit:
-                    p.target.hp -= p.damage
-                    if p.type == TowerType.SAP:
-                        p.target.frozen_timer = p.slow_duration
-                        p.target.frozen_factor = 0.3 if ('PERMA_SLOW' in self.towers[0].passives if self.towers else False) else 0.5
-                        if 'ACID' in p.passives: p.target.poison_timer = 180
-                        if 'ROOT' in p.passives and (pygame.time.get_ticks() % 10 == 0): p.target.frozen_factor = 0
-                    if p.stun_duration > 0:
-                        p.target.frozen_timer = p.stun_duration
-                        p.target.frozen_factor = 0
-                    if p.type == TowerType.ROCK and 'EXECUTE' in p.passives and p.target.hp < p.target.max_hp * 0.2:
-                        p.target.hp = -1
-                    if p.is_splash:
-                        for e in self.enemies:
-                            if e != p.target and get_distance((e.x, e.y), (p.target.x, p.target.y)) < 50:
-                                e.hp -= p.damage * 0.5
-                    self.projectiles.remove(p)
-                elif not p.active:
-                    self.projectiles.remove(p)
-
-            for e in self.enemies[:]:
-                if e.type == EnemyType.SHAMAN:
-                    if e.skill_cooldown > 0:
-                        e.skill_cooldown -= 1
-                    else:
-                        closest = None
-                        min_d = 150
-                        for t in self.towers:
-                            d = get_distance((e.x, e.y), (t.x, t.y))
-                            if d < min_d and t.disabled_timer <= 0:
-                                min_d = d
-                                closest = t
-                        if closest:
-                            closest.disabled_timer = 210
-                            e.skill_cooldown = 300
-
-                if e.hp <= 0:
-                    bounty = 5
-                    if e.type == EnemyType.TANK: bounty = 10
-                    if e.type == EnemyType.JUGGERNAUT: bounty = 20
-                    if e.type == EnemyType.SHAMAN: bounty = 25
-                    self.gold += bounty
-                    self.enemies.remove(e)
-                    continue
-
-                reached_end = e.update()
-                if reached_end:
-                    self.lives -= 1
-                    self.enemies.remove(e)
-                    if self.lives <= 0:
-                        self.state = GameState.GAME_OVER
-
-    def draw_game_layer(self):
-        if not self.current_level:
-            return
+    def update(self):
+        if self.state == GameState.PLAYING and self.sim:
+            self.sim.step()
+
+            if self.sfx:
+                now = pygame.time.get_ticks()
+                for event in self.sim.events:
+                    self.sfx.trigger(event, now)
+
+            if self.sim.state == GameState.VICTORY:
+                self.completed_levels.add(self.current_level['id'])
+            self.state = self.sim.state
+
+    def advance_simulation(self, elapsed_ms, max_frames=MAX_CATCHUP_FRAMES):
+        # Fixed timestep: bank real time, spend it in whole ticks
+        self.sim_accumulator += elapsed_ms * self.game_speed
+        max_ticks = self.game_speed * max_frames
+        ticks = 0
+        while self.sim_accumulator >= SIM_TICK_MS and self.state == GameState.PLAYING:
+            if ticks >= max_ticks:
+                # Too far behind; drop the backlog instead of spiralling
+                self.sim_accumulator = 0.0
+                break
+            if self.sim_accumulator < 2 * SIM_TICK_MS or ticks + 1 >= max_ticks:
+                self.snapshot_positions() # last tick this frame
+            self.update()
+            self.sim_accumulator -= SIM_TICK_MS
+            ticks += 1
+
+    def snapshot_positions(self):
+        prev = {e: (e.x, e.y) for e in self.sim.enemies}
+        for p in self.sim.projectiles:
+            prev[p] = (p.x, p.y)
+        self.prev_pos = prev
+
+    def interp_alpha(self):
+        # How far real time has run past the latest tick, as a fraction of a tick
+        if self.state != GameState.PLAYING: return 1.0
+        return min(self.sim_accumulator / SIM_TICK_MS, 1.0)
+
+    def interpolated(self, obj, alpha):
+        x, y = obj.x, obj.y
+        old = self.prev_pos.get(obj)
+        if old is None: return x, y
+        dx, dy = x - old[0], y - old[1]
+        if abs(dx) + abs(dy) > INTERP_MAX_JUMP: return x, y
+        return old[0] + dx * alpha, old[1] + dy * alpha
+
+    def is_animating(self):
+        if self.profiler: return True
+        if self.state != GameState.PLAYING or not self.sim: return False
+        # A selected empty spot pulses
+        return not self.sim.is_idle() or self.selected_spot_idx is not None
+
+    def hover(self, rect, partial_ok=True):
+        """Registers a hover-sensitive widget and reports whether the mouse is over it.
+        partial_ok=False marks widgets whose hover draws outside their rect (tooltips)."""
+        self.hover_regions.append((rect, partial_ok))
+        return rect.collidepoint(pygame.mouse.get_pos())
+
+    def hover_dirty_rects(self, old_pos, new_pos):
+        # None means the whole frame must be redrawn
+        dirty = []
+        for rect, partial_ok in self.hover_regions:
+            was, now = rect.collidepoint(old_pos), rect.collidepoint(new_pos)
+            if not partial_ok and (was or now): return None # tooltip follows the mouse
+            if was == now: continue
+            dirty.append(rect.inflate(2, 2))
+        return dirty
+
+    def toggle_profiler(self):
+        self.profiler = None if self.profiler else FrameProfiler()
+        if self.sim:
+            self.sim.profiler = self.profiler
+
+    def save_replay(self):
+        if not self.sim: return
+        path = time.strftime("td_replay_%Y%m%d_%H%M%S.json")
+        with open(path, 'w') as f:
+            json.dump(self.sim.recording(), f, separators=(',', ':'))
+        print(f"Replay written to {path}")
+
+    def export_profile(self):
+        if not self.profiler: return
+        path = self.profiler.export_csv(time.strftime("td_profile_%Y%m%d_%H%M%S.csv"))
+        print(f"Profile written to {path}")
+
+    def draw_profiler(self):
+        summary = self.profiler.summary
+        if not summary: return
+        rows = [("PROFILE ms", "p50", "p95", "p99")]
+        for name in FrameProfiler.SECTIONS + ('frame',):
+            rows.append((name,) + tuple(f"{v:.2f}" for v in summary[name]))
+        counts = dict(zip(FrameProfiler.COUNTS, summary['counts']))
+        footer = [f"ENEMIES {counts['enemies']}  PROJ {counts['projectiles']}  TOWERS {counts['towers']}"]
+        if self.sfx:
+            footer.append(f"SFX {self.sfx.played} played  {self.sfx.merged} merged  {self.sfx.dropped} dropped")
+        footer.append("F3 hide  F4 export CSV")
+
+        name_w, col_w, line_h = 130, 55, self.font_tiny.get_height()
+        w = name_w + 3 * col_w + 20
+        h = (len(rows) + len(footer)) * line_h + 20
+        x, y = 10, self.current_h - h - 10
+        panel = pygame.Rect(x, y, w, h)
+        pygame.draw.rect(self.screen, COLOR_BLACK, panel)
+        pygame.draw.rect(self.screen, COLOR_GRAY, panel, 1)
+        y += 10
+        for row in rows:
+            self.screen.blit(self.text_cache.render(self.font_tiny, row[0], True, COLOR_WHITE), (x + 10, y))
+            for c, cell in enumerate(row[1:]):
+                surf = self.text_cache.render(self.font_tiny, cell, True, COLOR_WHITE)
+                # Right-align the numbers in their column
+                self.screen.blit(surf, (x + 10 + name_w + (c + 1) * col_w - surf.get_width(), y))
+            y += line_h
+        for line in footer:
+            self.screen.blit(self.text_cache.render(self.font_tiny, line, True, COLOR_GRAY), (x + 10, y))
+            y += line_h
+
+    def cycle_game_speed(self):
+        i = GAME_SPEEDS.index(self.game_speed)
+        self.game_speed = GAME_SPEEDS[(i + 1) % len(GAME_SPEEDS)]
+
+    def get_static_layer(self):
+        # Grid, path and empty build spots only change on resize, level
+        # change, build/sell or spot selection; everything else is blitted over
+        show_level = self.sim is not None and self.state in (GameState.PLAYING, GameState.GAME_OVER, GameState.VICTORY)
+        if show_level:
+            key = (self.current_w, self.current_h, self.current_level['id'], self.sim.layout_version, self.selected_spot_idx)
+        else:
+            key = (self.current_w, self.current_h)
+        if key != self.static_layer_key:
+            self.static_layer = self.render_static_layer(show_level)
+            self.static_layer_key = key
+        return self.static_layer
+
+    def render_static_layer(self, show_level):
+        surf = pygame.Surface((self.current_w, self.current_h)).convert()
+        surf.fill(COLOR_BLACK)
+        for x in range(0, self.current_w, 40):
+            pygame.draw.line(surf, (15, 15, 15), (x, 0), (x, self.current_h))
+        for y in range(0, self.current_h, 40):
+            pygame.draw.line(surf, (15, 15, 15), (0, y), (self.current_w, y))
+
+        if not show_level:
+            return surf
 
         # 1. Draw Path
         pts = [self.to_screen_coords(p[0], p[1]) for p in self.current_level['path']]
         if len(pts) > 1:
-            pygame.draw.lines(self.screen, (30, 30, 30), False, pts, 30)
-            pygame.draw.lines(self.screen, COLOR_WHITE, False, pts, 2)
+            pygame.draw.lines(surf, (30, 30, 30), False, pts, 30)
+            pygame.draw.lines(surf, COLOR_WHITE, False, pts, 2)
             
             # Draw Arrow at start - ADJUSTED FOR SCREEN VISIBILITY
+            table = get_path_table(self.current_level['path'])
+            arrow = self.current_level['geometry'].arrow
             p0 = pts[0]
-            p1 = pts[1]
-            dx, dy = p1[0] - p0[0], p1[1] - p0[1]
-            dist = math.sqrt(dx*dx + dy*dy)
-            angle = math.atan2(dy, dx)
             
             # Default offset
             offset_dist = 60
@@ -742,91 +2830,87 @@ class Game:
             if p0[1] < 80:
                 offset_dist = 100 
 
-            center_x = p0[0] + (dx/dist * offset_dist)
-            center_y = p0[1] + (dy/dist * offset_dist)
+            center_x = p0[0] + (table.ux[0] * offset_dist)
+            center_y = p0[1] + (table.uy[0] * offset_dist)
             
             arrow_len = 20
             
-            # Tip
-            tip = (center_x + math.cos(angle)*arrow_len, center_y + math.sin(angle)*arrow_len)
-            # Left wing
-            left = (center_x + math.cos(angle + 2.5)*arrow_len, center_y + math.sin(angle + 2.5)*arrow_len)
-            # Right wing
-            right = (center_x + math.cos(angle - 2.5)*arrow_len, center_y + math.sin(angle - 2.5)*arrow_len)
+            # Tip, left wing, right wing: unit vectors precomputed by the level loader
+            tip = (center_x + arrow[0]*arrow_len, center_y + arrow[1]*arrow_len)
+            left = (center_x + arrow[2]*arrow_len, center_y + arrow[3]*arrow_len)
+            right = (center_x + arrow[4]*arrow_len, center_y + arrow[5]*arrow_len)
             
-            pygame.draw.polygon(self.screen, COLOR_WHITE, [tip, left, right])
+            pygame.draw.polygon(surf, COLOR_WHITE, [tip, left, right])
 
-        # 2. Draw Build Spots
+        # 2. Draw Build Spots (the selected one pulses in draw_game_layer)
         for i, spot in enumerate(self.current_level['buildSpots']):
+            if self.sim.tower_at_spot(i):
+                continue
             sx, sy = self.to_screen_coords(spot[0], spot[1])
-            occupied = False
-            for t in self.towers:
-                if t is None: continue
-                if t.x == spot[0] and t.y == spot[1]: 
-                    occupied = True
-                    break
-            
-            if not occupied:
-                spr = self.sprites['BUILD_SPOT']
-                rect = spr.get_rect(center=(sx, sy))
-                self.screen.blit(spr, rect)
-                
-                if self.selected_spot_idx == i:
-                    pulse = (math.sin(pygame.time.get_ticks() * 0.01) + 1) * 10
-                    pygame.draw.rect(self.screen, COLOR_WHITE, rect.inflate(pulse, pulse), 2)
-                else:
-                    pygame.draw.rect(self.screen, (100, 100, 100), rect.inflate(4, 4), 1)
+            spr = self.sprites['BUILD_SPOT']
+            rect = spr.get_rect(center=(sx, sy))
+            surf.blit(spr, rect)
+            if self.selected_spot_idx != i:
+                pygame.draw.rect(surf, (100, 100, 100), rect.inflate(4, 4), 1)
+        return surf
 
-        # 3. Draw Towers
-        for t in self.towers:
-            if t is None: continue
+    def draw_game_layer(self):
+        if not self.current_level:
+            return
+
+        # 1-2. Path and build spots are in the static layer
+        if self.selected_spot_idx is not None and not self.sim.tower_at_spot(self.selected_spot_idx):
+            spot = self.current_level['buildSpots'][self.selected_spot_idx]
+            rect = self.sprites['BUILD_SPOT'].get_rect(center=self.to_screen_coords(spot[0], spot[1]))
+            pulse = (math.sin(pygame.time.get_ticks() * 0.01) + 1) * 10
+            pygame.draw.rect(self.screen, COLOR_WHITE, rect.inflate(pulse, pulse), 2)
+
+        # 3-5. Towers, enemies and projectiles are collected as (surface, pos)
+        # in draw order and submitted with a single blits() call
+        anchors = self.sprite_anchors
+        fx = self.fx
+        tick = self.sim.tick
+        scale, ox0, oy0 = self.render_scale, self.offset_x, self.offset_y
+        batch = []
+        add = batch.append
+
+        for t in self.sim.towers:
+            sx, sy = t.x * scale + ox0, t.y * scale + oy0
+            spr, ox, oy = anchors[t.type]
+            add((spr, (sx - ox, sy - oy)))
+            spr, ox, oy = fx[('PIPS', t.level)]
+            add((spr, (sx - ox, sy - oy)))
+            if t.disabled_until > tick:
+                spr, ox, oy = fx['HEX']
+                add((spr, (sx - ox, sy - oy)))
+
+        alpha = self.interp_alpha()
+        ring = fx['RING']
+        for e in self.sim.enemies:
+            x, y = self.interpolated(e, alpha)
+            sx, sy = x * scale + ox0, y * scale + oy0
+            if e.frozen_until > tick:
+                spr, ox, oy = ring
+                add((spr, (sx - ox, sy - oy)))
+            spr, ox, oy = anchors[e.type]
+            add((spr, (sx - ox, sy - oy)))
+            spr, ox, oy = fx[('HP', min(max(math.ceil(e.hp / e.max_hp * HP_BAR_STEPS), 0), HP_BAR_STEPS))]
+            add((spr, (sx - ox, sy - oy)))
+
+        for p in self.sim.projectiles:
+            x, y = self.interpolated(p, alpha)
+            spr, ox, oy = fx[('SHOT', p.type)]
+            add((spr, (x * scale + ox0 - ox, y * scale + oy0 - oy)))
+
+        self.screen.blits(batch, doreturn=False)
+
+        t = self.selected_tower
+        if t is not None and t in self.sim.towers:
             sx, sy = self.to_screen_coords(t.x, t.y)
-            key = t.type
-            spr = self.sprites[key]
-            rect = spr.get_rect(center=(sx, sy))
-            self.screen.blit(spr, rect)
-            
-            if self.selected_tower == t:
-                pygame.draw.rect(self.screen, COLOR_WHITE, rect.inflate(10, 10), 2)
-                stats = TOWER_STATS[t.type]
-                rng = stats['range'] * (1 + (t.level - 1) * 0.2)
-                if t.has_passive('SNIPER'): rng *= 1.5
-                screen_rng = rng * self.render_scale
-                pygame.draw.circle(self.screen, COLOR_WHITE, (int(sx), int(sy)), int(screen_rng), 1)
-
-            for l in range(t.level):
-                px = sx - 15 + (l * 10)
-                pygame.draw.rect(self.screen, COLOR_WHITE, (px, sy - 40, 6, 6))
-
-            if t.disabled_timer > 0:
-                L = 20
-                pygame.draw.line(self.screen, COLOR_WHITE, (sx-L, sy-L), (sx+L, sy+L), 4)
-                pygame.draw.line(self.screen, COLOR_WHITE, (sx+L, sy-L), (sx-L, sy+L), 4)
-
-        # 4. Draw Enemies
-        for e in self.enemies:
-            sx, sy = self.to_screen_coords(e.x, e.y)
-            key = e.type
-            spr = self.sprites[key]
-            if e.frozen_timer > 0:
-                pygame.draw.circle(self.screen, COLOR_WHITE, (int(sx), int(sy)), 25, 1)
-            rect = spr.get_rect(center=(sx, sy))
-            self.screen.blit(spr, rect)
-            pct = max(0, e.hp / e.max_hp)
-            bar_w = 40
-            pygame.draw.rect(self.screen, COLOR_WHITE, (sx - bar_w/2, sy - 35, bar_w, 6), 1)
-            pygame.draw.rect(self.screen, COLOR_WHITE, (sx - bar_w/2 + 2, sy - 35 + 2, (bar_w - 4) * pct, 2))
-
-        # 5. Draw Projectiles
-        for p in self.projectiles:
-            sx, sy = self.to_screen_coords(p.x, p.y)
-            if p.type == TowerType.ROCK:
-                pygame.draw.rect(self.screen, COLOR_WHITE, (sx-8, sy-8, 16, 16))
-                pygame.draw.line(self.screen, COLOR_GRAY, (sx, sy), self.to_screen_coords(p.x - math.cos(0)*10, p.y - math.sin(0)*10), 4)
-            elif p.type == TowerType.SAP:
-                pygame.draw.circle(self.screen, COLOR_WHITE, (int(sx), int(sy)), 6)
-            else:
-                pygame.draw.rect(self.screen, COLOR_WHITE, (sx-4, sy-4, 8, 8))
+            rect = self.sprites[t.type].get_rect(center=(sx, sy))
+            pygame.draw.rect(self.screen, COLOR_WHITE, rect.inflate(10, 10), 2)
+            screen_rng = t.get_range() * self.render_scale
+            pygame.draw.circle(self.screen, COLOR_WHITE, (int(sx), int(sy)), int(screen_rng), 1)
 
     def draw_ui(self):
         self.ui_rects.clear()
@@ -835,39 +2919,43 @@ class Game:
             pygame.draw.rect(self.screen, COLOR_BLACK, (0, 0, self.current_w, 60))
             pygame.draw.line(self.screen, COLOR_WHITE, (0, 60), (self.current_w, 60), 2)
             
-            lives_s = self.font_med.render(f"LIVES: {self.lives}", True, COLOR_WHITE)
-            gold_s = self.font_med.render(f"GOLD: {self.gold}", True, COLOR_WHITE)
-            wave_s = self.font_med.render(f"WAVE: {self.wave_index+1}/{len(self.current_level['waves'])}", True, COLOR_WHITE)
+            lives_s = self.text_cache.render(self.font_med, f"LIVES: {self.sim.lives}", True, COLOR_WHITE)
+            gold_s = self.text_cache.render(self.font_med, f"GOLD: {self.sim.gold}", True, COLOR_WHITE)
+            wave_count = self.sim.wave_count
+            wave_txt = f"WAVE: {self.sim.wave_index+1}/{wave_count}" if wave_count else f"WAVE: {self.sim.wave_index+1}"
+            wave_s = self.text_cache.render(self.font_med, wave_txt, True, COLOR_WHITE)
             
             self.screen.blit(lives_s, (50, 15))
             self.screen.blit(gold_s, (300, 15))
             self.screen.blit(wave_s, (self.current_w - 350, 15))
             
-            if not self.wave_active and self.wave_index < len(self.current_level['waves']):
+            if not self.sim.wave_active and (wave_count is None or self.sim.wave_index < wave_count):
                 btn_rect = pygame.Rect(self.current_w//2 - 100, 10, 200, 40)
-                hover = btn_rect.collidepoint(pygame.mouse.get_pos())
+                hover = self.hover(btn_rect)
                 bg_color = COLOR_WHITE if hover else COLOR_BLACK
                 txt_color = COLOR_BLACK if hover else COLOR_WHITE
                 pygame.draw.rect(self.screen, COLOR_WHITE, btn_rect, 0 if hover else 2)
-                txt = self.font_small.render("START WAVE", True, txt_color)
+                txt = self.text_cache.render(self.font_small, "START WAVE", True, txt_color)
                 self.screen.blit(txt, txt.get_rect(center=btn_rect.center))
                 self.ui_rects["START_WAVE"] = btn_rect
 
                 # --- NEXT ENEMY TEXT ---
-                next_wave_data = self.current_level['waves'][self.wave_index]
-                e_type_name = next_wave_data['enemyType'].name
-                info_txt = self.font_small.render(f"INCOMING: {e_type_name}", True, COLOR_WHITE)
+                e_type_name = "+".join(g[0].name for g in self.sim.wave_groups())
+                info_txt = self.text_cache.render(self.font_small, f"INCOMING: {e_type_name}", True, COLOR_WHITE)
                 # Position it to the right of the button
                 self.screen.blit(info_txt, (btn_rect.right + 20, btn_rect.centery - info_txt.get_height()//2))
 
             quit_rect = pygame.Rect(self.current_w - 120, 15, 100, 30)
             pygame.draw.rect(self.screen, COLOR_WHITE, quit_rect, 1)
-            q_txt = self.font_tiny.render("QUIT", True, COLOR_WHITE)
+            q_txt = self.text_cache.render(self.font_tiny, "QUIT", True, COLOR_WHITE)
             self.screen.blit(q_txt, q_txt.get_rect(center=quit_rect.center))
             self.ui_rects["QUIT"] = quit_rect
 
-            if self.wave_clear_timer > 0:
-                txt = self.font_xl.render("WAVE CLEARED", True, COLOR_WHITE)
+            spd_txt = self.text_cache.render(self.font_tiny, f"SPEED {self.game_speed}x [TAB]", True, COLOR_WHITE if self.game_speed > 1 else COLOR_GRAY)
+            self.screen.blit(spd_txt, (10, 68))
+
+            if self.sim.wave_clear_timer > 0:
+                txt = self.text_cache.render(self.font_xl, "WAVE CLEARED", True, COLOR_WHITE)
                 c = (self.current_w//2, self.current_h//2)
                 self.screen.blit(txt, txt.get_rect(center=c))
 
@@ -913,7 +3001,7 @@ class Game:
 
             pygame.draw.rect(self.screen, COLOR_BLACK, menu_rect)
             pygame.draw.rect(self.screen, COLOR_WHITE, menu_rect, 3)
-            title = self.font_small.render("Select Tower", True, COLOR_WHITE)
+            title = self.text_cache.render(self.font_small, "Select Tower", True, COLOR_WHITE)
             self.screen.blit(title, (menu_x + 10, menu_y + 5))
 
             for i, t_type in enumerate(TowerType):
@@ -922,14 +3010,14 @@ class Game:
                 b_rect = pygame.Rect(bx, by, btn_w, btn_h)
                 
                 stats = TOWER_STATS[t_type]
-                can_afford = self.gold >= stats['cost']
+                can_afford = self.sim.gold >= stats['cost']
                 color = COLOR_WHITE if can_afford else COLOR_GRAY
                 
-                is_hover = b_rect.collidepoint(mx, my)
+                is_hover = self.hover(b_rect, partial_ok=False)
                 pygame.draw.rect(self.screen, color, b_rect, 1 if not is_hover else 3)
                 
-                n_txt = self.font_tiny.render(stats['name'], True, color)
-                c_txt = self.font_tiny.render(f"{stats['cost']}G", True, color)
+                n_txt = self.text_cache.render(self.font_tiny, stats['name'], True, color)
+                c_txt = self.text_cache.render(self.font_tiny, f"{stats['cost']}G", True, color)
                 self.screen.blit(n_txt, (bx + 5, by + 5))
                 self.screen.blit(c_txt, (bx + 5, by + 45))
                 
@@ -942,7 +3030,7 @@ class Game:
         elif self.selected_tower:
             t = self.selected_tower
             sx, sy = self.to_screen_coords(t.x, t.y)
-            menu_w, menu_h = 400, 180
+            menu_w, menu_h = 400, 220
             menu_x = sx - menu_w // 2
             
             menu_y = sy - 150
@@ -957,32 +3045,32 @@ class Game:
             pygame.draw.rect(self.screen, COLOR_WHITE, menu_rect, 3)
             
             stats = TOWER_STATS[t.type]
-            t_title = self.font_med.render(f"{stats['name']} Lv.{t.level}", True, COLOR_WHITE)
+            t_title = self.text_cache.render(self.font_med, f"{stats['name']} Lv.{t.level}", True, COLOR_WHITE)
             self.screen.blit(t_title, (menu_x + 10, menu_y + 10))
             sell_rect = pygame.Rect(menu_x + menu_w - 80, menu_y + 10, 70, 30)
             pygame.draw.rect(self.screen, COLOR_WHITE, sell_rect, 1)
-            s_txt = self.font_tiny.render("SELL", True, COLOR_WHITE)
+            s_txt = self.text_cache.render(self.font_tiny, "SELL", True, COLOR_WHITE)
             self.screen.blit(s_txt, s_txt.get_rect(center=sell_rect.center))
             self.ui_rects["SELL"] = sell_rect
             if t.level < 4:
-                cost = int(stats['cost'] * (UPGRADE_COST_MULTIPLIER ** t.level))
+                cost = self.sim.upgrade_cost(t)
                 upg_rect = pygame.Rect(menu_x + 10, menu_y + 50, 380, 50)
-                can_afford = self.gold >= cost
+                can_afford = self.sim.gold >= cost
                 color = COLOR_WHITE if can_afford else COLOR_GRAY
                 pygame.draw.rect(self.screen, color, upg_rect, 2)
-                u_txt = self.font_small.render(f"UPGRADE ({cost}G) - Boost Stats", True, color)
+                u_txt = self.text_cache.render(self.font_small, f"UPGRADE ({cost}G) - Boost Stats", True, color)
                 self.screen.blit(u_txt, u_txt.get_rect(center=upg_rect.center))
                 self.ui_rects["UPGRADE"] = upg_rect
-                if upg_rect.collidepoint(pygame.mouse.get_pos()):
+                if self.hover(upg_rect, partial_ok=False):
                     self.tooltip = ("Upgrade", "Increases Damage & Range", "", f"Cost: {cost}")
             else:
-                 max_txt = self.font_small.render("MAX LEVEL", True, COLOR_WHITE)
+                 max_txt = self.text_cache.render(self.font_small, "MAX LEVEL", True, COLOR_WHITE)
                  self.screen.blit(max_txt, (menu_x + 10, menu_y + 60))
             p_y = menu_y + 110
             for i, p in enumerate(TOWER_PASSIVES[t.type]):
                 p_rect = pygame.Rect(menu_x + 10 + i*130, p_y, 120, 60)
                 owned = p['id'] in t.passives
-                can_buy = self.gold >= p['cost']
+                can_buy = self.sim.gold >= p['cost']
                 if owned:
                     pygame.draw.rect(self.screen, COLOR_WHITE, p_rect)
                     c_txt = COLOR_BLACK
@@ -990,24 +3078,37 @@ class Game:
                     color = COLOR_WHITE if can_buy else COLOR_GRAY
                     pygame.draw.rect(self.screen, color, p_rect, 1)
                     c_txt = color
-                nm = self.font_tiny.render(p['name'], True, c_txt)
-                pr = self.font_tiny.render("OWNED" if owned else f"{p['cost']}G", True, c_txt)
+                nm = self.text_cache.render(self.font_tiny, p['name'], True, c_txt)
+                pr = self.text_cache.render(self.font_tiny, "OWNED" if owned else f"{p['cost']}G", True, c_txt)
                 self.screen.blit(nm, (p_rect.x + 5, p_rect.y + 5))
                 self.screen.blit(pr, (p_rect.x + 5, p_rect.y + 40))
                 if not owned:
                     self.ui_rects[f"PASSIVE_{p['id']}"] = p_rect
-                if p_rect.collidepoint(pygame.mouse.get_pos()):
+                if self.hover(p_rect, partial_ok=False):
                     self.tooltip = (p['name'], p['desc'], "", "OWNED" if owned else f"Cost: {p['cost']}")
+            tgt_rect = pygame.Rect(menu_x + 10, menu_y + 180, 380, 30)
+            pygame.draw.rect(self.screen, COLOR_WHITE, tgt_rect, 2 if self.hover(tgt_rect) else 1)
+            tg_txt = self.text_cache.render(self.font_tiny, f"TARGET: {t.target_policy.name}", True, COLOR_WHITE)
+            self.screen.blit(tg_txt, tg_txt.get_rect(center=tgt_rect.center))
+            self.ui_rects["TARGET"] = tgt_rect
+
+        # --- ENEMY HOVER ---
+        if self.tooltip is None and self.state == GameState.PLAYING and self.sim and self.sim.enemies:
+            mx, my = pygame.mouse.get_pos()
+            if my > 60: # below the HUD bar
+                e = self.pick_enemy(*self.to_logical_coords(mx, my))
+                if e is not None:
+                    self.tooltip = self.enemy_tooltip(e)
 
         # --- DYNAMIC TOOLTIP SCALING ---
         if self.tooltip:
             mx, my = pygame.mouse.get_pos()
             tt_title, tt_desc, tt_stats, tt_cost = self.tooltip
             
-            s_title = self.font_med.render(tt_title, True, COLOR_WHITE)
-            s_desc = self.font_small.render(tt_desc, True, (200, 200, 200))
-            s_stats = self.font_tiny.render(tt_stats, True, COLOR_WHITE)
-            s_cost = self.font_small.render(tt_cost, True, COLOR_WHITE)
+            s_title = self.text_cache.render(self.font_med, tt_title, True, COLOR_WHITE)
+            s_desc = self.text_cache.render(self.font_small, tt_desc, True, (200, 200, 200))
+            s_stats = self.text_cache.render(self.font_tiny, tt_stats, True, COLOR_WHITE)
+            s_cost = self.text_cache.render(self.font_small, tt_cost, True, COLOR_WHITE)
             
             padding = 20
             content_w = max(s_title.get_width(), s_desc.get_width(), s_stats.get_width(), s_cost.get_width())
@@ -1032,20 +3133,158 @@ class Game:
             current_y += s_stats.get_height() + 5
             self.screen.blit(s_cost, (tt_x+10, current_y))
 
+    def render_frame(self, prof):
+        perf = time.perf_counter
+        self.hover_regions = []
+        self.screen.blit(self.get_static_layer(), (0, 0))
+
+        if self.state == GameState.MENU:
+            title = self.text_cache.render(self.font_xl, "Monochrome Tower Defense", True, COLOR_WHITE)
+            sub = self.text_cache.render(self.font_med, "Defend Pixels with Pixels", True, COLOR_GRAY)
+            tr = title.get_rect(center=(self.current_w//2, self.current_h//3))
+            sr = sub.get_rect(center=(self.current_w//2, self.current_h//3 + 80))
+            self.screen.blit(title, tr)
+            self.screen.blit(sub, sr)
+            btn_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 50, 300, 80)
+            pygame.draw.rect(self.screen, COLOR_WHITE, btn_rect, 4)
+            txt = self.text_cache.render(self.font_large, "START GAME", True, COLOR_WHITE)
+            self.screen.blit(txt, txt.get_rect(center=btn_rect.center))
+                
+            # --- MODIFIED QUIT BUTTON RENDER ---
+            quit_mm_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 150, 300, 50)
+            pygame.draw.rect(self.screen, COLOR_WHITE, quit_mm_rect, 2)
+                
+            q_text_str = "REALLY QUIT?" if self.menu_quit_confirm else "QUIT"
+            q_color = COLOR_RED if self.menu_quit_confirm else COLOR_WHITE
+                
+            q_txt = self.text_cache.render(self.font_med, q_text_str, True, q_color)
+            self.screen.blit(q_txt, q_txt.get_rect(center=quit_mm_rect.center))
+                
+            hint = self.text_cache.render(self.font_tiny, "Press F11 for Fullscreen", True, COLOR_GRAY)
+            self.screen.blit(hint, (10, self.current_h - 30))
+
+        elif self.state == GameState.LEVEL_SELECT:
+            title = self.text_cache.render(self.font_xl, "SELECT LEVEL", True, COLOR_WHITE)
+            tr = title.get_rect(center=(self.current_w//2, 100))
+            self.screen.blit(title, tr)
+            cards, page_rects = self.level_select_layout()
+            start_y = self.current_h // 2 - 50
+            for level, r in cards:
+                color = COLOR_WHITE
+                if self.hover(r):
+                    pygame.draw.rect(self.screen, (30,30,30), r)
+                    pygame.draw.rect(self.screen, COLOR_WHITE, r, 4)
+                else:
+                    pygame.draw.rect(self.screen, COLOR_BLACK, r)
+                    pygame.draw.rect(self.screen, COLOR_GRAY, r, 2)
+                    
+                id_txt = self.text_cache.render(self.font_xl, str(level['id']), True, color)
+                name_txt = self.text_cache.render(self.font_med, level['name'], True, color)
+                self.screen.blit(id_txt, id_txt.get_rect(center=(r.centerx, r.centery - 30)))
+                self.screen.blit(name_txt, name_txt.get_rect(center=(r.centerx, r.centery + 30)))
+
+                if level['id'] in self.completed_levels:
+                    pygame.draw.circle(self.screen, COLOR_PURE_GREEN, (r.right - 20, r.bottom - 20), 10)
+                    pygame.draw.circle(self.screen, COLOR_WHITE, (r.right - 20, r.bottom - 20), 10, 2)
+
+            for key, r in page_rects.items():
+                pygame.draw.rect(self.screen, COLOR_WHITE if self.hover(r) else COLOR_GRAY, r, 2)
+                a_txt = self.text_cache.render(self.font_med, "<" if key == "PREV" else ">", True, COLOR_WHITE)
+                self.screen.blit(a_txt, a_txt.get_rect(center=r.center))
+
+            endless_rect = pygame.Rect(self.current_w//2 - 120, start_y - 60, 240, 32)
+            pygame.draw.rect(self.screen, COLOR_WHITE if self.hover(endless_rect) else COLOR_GRAY, endless_rect, 2)
+            e_txt = self.text_cache.render(self.font_small, f"ENDLESS: {'ON' if self.endless_mode else 'OFF'}", True, COLOR_WHITE)
+            self.screen.blit(e_txt, e_txt.get_rect(center=endless_rect.center))
+                
+            # Check for 100% completion
+            if len(self.completed_levels) == len(LEVELS):
+                trophy = self.sprites['TROPHY']
+                # Position above the BACK button
+                tr_rect = trophy.get_rect(center=(self.current_w // 2, self.current_h - 170))
+                self.screen.blit(trophy, tr_rect)
+                    
+                txt = self.text_cache.render(self.font_tiny, "ALL CLEARED!", True, COLOR_WHITE)
+                self.screen.blit(txt, txt.get_rect(center=(self.current_w // 2, self.current_h - 140)))
+
+            back_rect = pygame.Rect(self.current_w//2 - 75, self.current_h - 100, 150, 50)
+            pygame.draw.rect(self.screen, COLOR_GRAY, back_rect, 1)
+            b_txt = self.text_cache.render(self.font_small, "BACK", True, COLOR_GRAY)
+            self.screen.blit(b_txt, b_txt.get_rect(center=back_rect.center))
+
+        elif self.state == GameState.PLAYING:
+            if prof:
+                t0 = perf()
+                self.draw_game_layer()
+                t1 = perf()
+                self.draw_ui()
+                prof.add('draw_game_layer', t1 - t0)
+                prof.add('draw_ui', perf() - t1)
+            else:
+                self.draw_game_layer()
+                self.draw_ui()
+
+        elif self.state == GameState.GAME_OVER or self.state == GameState.VICTORY:
+            self.draw_game_layer()
+            overlay = pygame.Surface((self.current_w, self.current_h))
+            overlay.set_alpha(200)
+            overlay.fill((0,0,0))
+            self.screen.blit(overlay, (0,0))
+            txt_str = "VICTORY" if self.state == GameState.VICTORY else "GAME OVER"
+            color = COLOR_WHITE
+            title = self.text_cache.render(self.font_xl, txt_str, True, color)
+            sub = self.text_cache.render(self.font_large, f"You reached Wave {self.sim.wave_index + 1}", True, COLOR_WHITE)
+            self.screen.blit(title, title.get_rect(center=(self.current_w//2, self.current_h//2 - 80)))
+            self.screen.blit(sub, sub.get_rect(center=(self.current_w//2, self.current_h//2)))
+            btn_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 100, 300, 80)
+            pygame.draw.rect(self.screen, COLOR_WHITE, btn_rect, 2)
+            t = self.text_cache.render(self.font_large, "MENU", True, COLOR_WHITE)
+            self.screen.blit(t, t.get_rect(center=btn_rect.center))
+
     def run(self):
+        if self.loader is not None:
+            self.show_loading_screen()
+        frame_ms = 0
+        perf = time.perf_counter
+        last_mouse = pygame.mouse.get_pos()
+        self.needs_redraw = True
         while True:
+            prof = self.profiler
+            if self.needs_redraw or self.is_animating():
+                events = pygame.event.get()
+            else:
+                # Nothing on screen moves: sleep until there is input
+                event = pygame.event.wait(IDLE_WAIT_MS)
+                events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+                self.clock.tick() # the time spent asleep is not game time
+                frame_ms = 0
+            if prof: frame_start = perf()
             self.tooltip = None
-            for event in pygame.event.get():
+            full_redraw = False
+            for event in events:
+                if event.type != pygame.MOUSEMOTION:
+                    full_redraw = True
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_F11:
                         self.toggle_fullscreen()
+                    elif event.key == pygame.K_TAB:
+                        self.cycle_game_speed()
+                    elif event.key == pygame.K_F3:
+                        self.toggle_profiler()
+                    elif event.key == pygame.K_F4:
+                        self.export_profile()
+                    elif event.key == pygame.K_F6:
+                        self.save_replay()
+                elif event.type in (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN):
+                    self.window_hidden = True
+                elif event.type in (pygame.WINDOWRESTORED, pygame.WINDOWSHOWN, pygame.WINDOWEXPOSED):
+                    self.window_hidden = False
                 elif event.type == pygame.VIDEORESIZE:
                     if not self.is_fullscreen:
-                        self.current_w, self.current_h = event.w, event.h
-                        self.screen = pygame.display.set_mode((self.current_w, self.current_h), pygame.RESIZABLE)
+                        self.set_display_mode((event.w, event.h), pygame.RESIZABLE)
                         self.recalculate_scaling()
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1: 
@@ -1068,14 +3307,17 @@ class Game:
                                 self.menu_quit_confirm = False
 
                         elif self.state == GameState.LEVEL_SELECT:
-                            w, h = 300, 200
-                            gap = 50
-                            start_x = (self.current_w - (3*w + 2*gap)) // 2
+                            cards, page_rects = self.level_select_layout()
                             start_y = self.current_h // 2 - 50
-                            for i, level in enumerate(LEVELS):
-                                r = pygame.Rect(start_x + i*(w+gap), start_y, w, h)
+                            for level, r in cards:
                                 if r.collidepoint(pos):
                                     self.reset_game(level)
+                            for key, r in page_rects.items():
+                                if r.collidepoint(pos):
+                                    self.level_page += -1 if key == "PREV" else 1
+                            endless_rect = pygame.Rect(self.current_w//2 - 120, start_y - 60, 240, 32)
+                            if endless_rect.collidepoint(pos):
+                                self.endless_mode = not self.endless_mode
                             back_rect = pygame.Rect(self.current_w//2 - 75, self.current_h - 100, 150, 50)
                             if back_rect.collidepoint(pos):
                                 self.state = GameState.MENU
@@ -1094,138 +3336,256 @@ class Game:
                                         self.start_wave()
                                     elif key.startswith("BUILD_"):
                                         t_type = TowerType[key.split("_")[1]]
-                                        cost = TOWER_STATS[t_type]['cost']
-                                        if self.gold >= cost and self.selected_spot_idx is not None and self.current_level:
-                                            spot = self.current_level['buildSpots'][self.selected_spot_idx]
-                                            self.gold -= cost
-                                            new_t = Tower(t_type, spot[0], spot[1])
-                                            self.towers.append(new_t)
-                                            self.selected_spot_idx = None
-                                            self.selected_tower = new_t
+                                        if self.selected_spot_idx is not None and self.sim:
+                                            new_t = self.sim.build_tower(t_type, self.selected_spot_idx)
+                                            if new_t:
+                                                self.selected_spot_idx = None
+                                                self.selected_tower = new_t
                                     elif key == "SELL":
                                         if self.selected_tower:
-                                            val = int(TOWER_STATS[self.selected_tower.type]['cost'] * 0.5)
-                                            self.gold += val
-                                            self.towers.remove(self.selected_tower)
+                                            self.sim.sell_tower(self.selected_tower)
                                             self.selected_tower = None
                                     elif key == "UPGRADE":
                                         if self.selected_tower:
-                                            t = self.selected_tower
-                                            cost = int(TOWER_STATS[t.type]['cost'] * (UPGRADE_COST_MULTIPLIER ** t.level))
-                                            if self.gold >= cost and t.level < 4:
-                                                self.gold -= cost
-                                                t.level += 1
+                                            self.sim.upgrade_tower(self.selected_tower)
                                     elif key.startswith("PASSIVE_"):
                                         if self.selected_tower:
                                             pid = key.split("_", 1)[1]
-                                            t = self.selected_tower
-                                            p_data = next(p for p in TOWER_PASSIVES[t.type] if p['id'] == pid)
-                                            if self.gold >= p_data['cost']:
-                                                self.gold -= p_data['cost']
-                                                t.passives.append(pid)
+                                            self.sim.buy_passive(self.selected_tower, pid)
+                                    elif key == "TARGET":
+                                        if self.selected_tower:
+                                            policies = list(TargetPolicy)
+                                            nxt = policies[(policies.index(self.selected_tower.target_policy) + 1) % len(policies)]
+                                            self.sim.set_target_policy(self.selected_tower, nxt)
                                     break
                             if not clicked_ui:
                                 self.handle_click(pos)
 
-            self.screen.fill(COLOR_BLACK) 
-            for x in range(0, self.current_w, 40):
-                pygame.draw.line(self.screen, (15, 15, 15), (x, 0), (x, self.current_h))
-            for y in range(0, self.current_h, 40):
-                pygame.draw.line(self.screen, (15, 15, 15), (0, y), (self.current_w, y))
-
-            if self.state == GameState.MENU:
-                title = self.font_xl.render("Monochrome Tower Defense", True, COLOR_WHITE)
-                sub = self.font_med.render("Defend Pixels with Pixels", True, COLOR_GRAY)
-                tr = title.get_rect(center=(self.current_w//2, self.current_h//3))
-                sr = sub.get_rect(center=(self.current_w//2, self.current_h//3 + 80))
-                self.screen.blit(title, tr)
-                self.screen.blit(sub, sr)
-                btn_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 50, 300, 80)
-                pygame.draw.rect(self.screen, COLOR_WHITE, btn_rect, 4)
-                txt = self.font_large.render("START GAME", True, COLOR_WHITE)
-                self.screen.blit(txt, txt.get_rect(center=btn_rect.center))
-                
-                # --- MODIFIED QUIT BUTTON RENDER ---
-                quit_mm_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 150, 300, 50)
-                pygame.draw.rect(self.screen, COLOR_WHITE, quit_mm_rect, 2)
-                
-                q_text_str = "REALLY QUIT?" if self.menu_quit_confirm else "QUIT"
-                q_color = COLOR_RED if self.menu_quit_confirm else COLOR_WHITE
-                
-                q_txt = self.font_med.render(q_text_str, True, q_color)
-                self.screen.blit(q_txt, q_txt.get_rect(center=quit_mm_rect.center))
-                
-                hint = self.font_tiny.render("Press F11 for Fullscreen", True, COLOR_GRAY)
-                self.screen.blit(hint, (10, self.current_h - 30))
-
-            elif self.state == GameState.LEVEL_SELECT:
-                title = self.font_xl.render("SELECT LEVEL", True, COLOR_WHITE)
-                tr = title.get_rect(center=(self.current_w//2, 100))
-                self.screen.blit(title, tr)
-                w, h = 300, 200
-                gap = 50
-                start_x = (self.current_w - (3*w + 2*gap)) // 2
-                start_y = self.current_h // 2 - 50
-                mx, my = pygame.mouse.get_pos()
-                for i, level in enumerate(LEVELS):
-                    r = pygame.Rect(start_x + i*(w+gap), start_y, w, h)
-                    color = COLOR_WHITE
-                    if r.collidepoint(mx, my):
-                        pygame.draw.rect(self.screen, (30,30,30), r)
-                        pygame.draw.rect(self.screen, COLOR_WHITE, r, 4)
-                    else:
-                        pygame.draw.rect(self.screen, COLOR_BLACK, r)
-                        pygame.draw.rect(self.screen, COLOR_GRAY, r, 2)
-                    
-                    id_txt = self.font_xl.render(str(level['id']), True, color)
-                    name_txt = self.font_med.render(level['name'], True, color)
-                    self.screen.blit(id_txt, id_txt.get_rect(center=(r.centerx, r.centery - 30)))
-                    self.screen.blit(name_txt, name_txt.get_rect(center=(r.centerx, r.centery + 30)))
-
-                    if level['id'] in self.completed_levels:
-                        pygame.draw.circle(self.screen, COLOR_PURE_GREEN, (r.right - 20, r.bottom - 20), 10)
-                        pygame.draw.circle(self.screen, COLOR_WHITE, (r.right - 20, r.bottom - 20), 10, 2)
-                
-                # Check for 100% completion
-                if len(self.completed_levels) == len(LEVELS):
-                    trophy = self.sprites['TROPHY']
-                    # Position above the BACK button
-                    tr_rect = trophy.get_rect(center=(self.current_w // 2, self.current_h - 170))
-                    self.screen.blit(trophy, tr_rect)
-                    
-                    txt = self.font_tiny.render("ALL CLEARED!", True, COLOR_WHITE)
-                    self.screen.blit(txt, txt.get_rect(center=(self.current_w // 2, self.current_h - 140)))
-
-                back_rect = pygame.Rect(self.current_w//2 - 75, self.current_h - 100, 150, 50)
-                pygame.draw.rect(self.screen, COLOR_GRAY, back_rect, 1)
-                b_txt = self.font_small.render("BACK", True, COLOR_GRAY)
-                self.screen.blit(b_txt, b_txt.get_rect(center=back_rect.center))
-
-            elif self.state == GameState.PLAYING:
-                self.update()
-                self.draw_game_layer()
-                self.draw_ui()
+            if prof: prof.add('events', perf() - frame_start)
+
+            if self.state == GameState.PLAYING:
+                # Hidden windows still play on, with a bigger catch-up budget per wake-up
+                self.advance_simulation(frame_ms, HIDDEN_CATCHUP_FRAMES if self.window_hidden else MAX_CATCHUP_FRAMES)
+
+            if self.window_hidden:
+                frame_ms = self.clock.tick(HIDDEN_FPS)
+                continue
+
+            animating = self.is_animating()
+            mouse = pygame.mouse.get_pos()
+            dirty = None
+            if not (full_redraw or animating or self.needs_redraw):
+                dirty = self.hover_dirty_rects(last_mouse, mouse)
+            last_mouse = mouse
+
+            if dirty is None:
+                self.render_frame(prof)
+                if prof:
+                    self.draw_profiler()
+                    t0 = perf()
+                    pygame.display.flip()
+                    t1 = perf()
+                    prof.add('flip', t1 - t0)
+                    counts = (len(self.sim.enemies), len(self.sim.projectiles), len(self.sim.towers)) if self.sim else (0, 0, 0)
+                    prof.end_frame(t1 - frame_start, counts)
+                else:
+                    pygame.display.flip()
+            elif dirty:
+                # Only hover highlights changed: redraw and present just those rects
+                clip = dirty[0].unionall(dirty[1:])
+                self.screen.set_clip(clip)
+                self.render_frame(prof)
+                self.screen.set_clip(None)
+                pygame.display.update(clip)
+            self.needs_redraw = animating
+            if 'interactive' not in self.startup:
+                self.startup['interactive'] = startup_ms()
+                if self.exit_after_startup:
+                    return self.startup_report()
+            # An idle frame presents nothing, so vsync can't pace it
+            frame_ms = self.clock.tick(FPS if dirty == [] else self.frame_cap())
+
+# --- BENCHMARKS ---
+
+def bench_build(sim, max_level=1, passives=False):
+    sim.gold = 10**9
+    for i in range(len(sim.level['buildSpots'])):
+        t = sim.build_tower(BUILD_CYCLE[i % len(BUILD_CYCLE)], i)
+        while t.level < max_level:
+            sim.upgrade_tower(t)
+        if passives:
+            for p in TOWER_PASSIVES[t.type]:
+                sim.buy_passive(t, p['id'])
+    sim.lives = 10**6 # keep the scenario running for its full length
+
+def bench_full_board(sim):
+    bench_build(sim, max_level=4, passives=True)
+    sim.wave_index = 9
+
+def bench_juggernaut(sim):
+    bench_build(sim)
+    sim.wave_index = 14
+
+def bench_horde(sim):
+    bench_build(sim, max_level=4, passives=True)
+    length = get_path_table(sim.level['path']).length
+    for i in range(2000):
+        e = sim.spawn_enemy(EnemyType.NORMAL, 14, distance=length * i / 2000)
+        e.hp = e.max_hp = 10**9
+
+# One plain scenario per level file, plus stress cases on the last levels
+BENCH_SCENARIOS = {f"level_{lv['id']}": {'level': i, 'setup': bench_build, 'ticks': 3600} for i, lv in enumerate(LEVELS)}
+BENCH_SCENARIOS.update({
+    'full_board': {'level': len(LEVELS) - 1, 'setup': bench_full_board, 'ticks': 3600},
+    'wave15_juggernaut': {'level': len(LEVELS) - 1, 'setup': bench_juggernaut, 'ticks': 3600},
+    'horde_2000': {'level': min(1, len(LEVELS) - 1), 'setup': bench_horde, 'ticks': 300, 'waves': False},
+})
+
+BENCH_PHASES = ('update', 'draw_game_layer', 'draw_ui', 'frame')
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered: return 0.0
+    idx = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+def summarize_times(values):
+    return {
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
 
-            elif self.state == GameState.GAME_OVER or self.state == GameState.VICTORY:
-                self.draw_game_layer()
-                overlay = pygame.Surface((self.current_w, self.current_h))
-                overlay.set_alpha(200)
-                overlay.fill((0,0,0))
-                self.screen.blit(overlay, (0,0))
-                txt_str = "VICTORY" if self.state == GameState.VICTORY else "GAME OVER"
-                color = COLOR_WHITE
-                title = self.font_xl.render(txt_str, True, color)
-                sub = self.font_large.render(f"You reached Wave {self.wave_index + 1}", True, COLOR_WHITE)
-                self.screen.blit(title, title.get_rect(center=(self.current_w//2, self.current_h//2 - 80)))
-                self.screen.blit(sub, sub.get_rect(center=(self.current_w//2, self.current_h//2)))
-                btn_rect = pygame.Rect(self.current_w//2 - 150, self.current_h//2 + 100, 300, 80)
-                pygame.draw.rect(self.screen, COLOR_WHITE, btn_rect, 2)
-                t = self.font_large.render("MENU", True, COLOR_WHITE)
-                self.screen.blit(t, t.get_rect(center=btn_rect.center))
+def run_benchmarks(names=None, use_numpy=False, scheduled_hits=False):
+    # Draw calls go to an offscreen surface; no window is needed
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    game = Game()
+    game.finish_loading()
+    game.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    results = {}
+    for name, sc in BENCH_SCENARIOS.items():
+        if names and name not in names: continue
+        game.reset_game(LEVELS[sc['level']])
+        game.sim = Simulation(LEVELS[sc['level']], use_numpy=use_numpy, scheduled_hits=scheduled_hits)
+        sc['setup'](game.sim)
+
+        times = {phase: [] for phase in BENCH_PHASES}
+        perf = time.perf_counter
+        for _ in range(sc['ticks']):
+            if game.state != GameState.PLAYING: break
+            if sc.get('waves', True) and not game.sim.wave_active:
+                game.sim.start_wave()
+            t0 = perf()
+            game.update()
+            t1 = perf()
+            game.screen.blit(game.get_static_layer(), (0, 0))
+            game.draw_game_layer()
+            t2 = perf()
+            game.draw_ui()
+            t3 = perf()
+            times['update'].append((t1 - t0) * 1000)
+            times['draw_game_layer'].append((t2 - t1) * 1000)
+            times['draw_ui'].append((t3 - t2) * 1000)
+            times['frame'].append((t3 - t0) * 1000)
+
+        ticks = len(times['update'])
+        update_s = sum(times['update']) / 1000
+        results[name] = {
+            'ticks': ticks,
+            'ticks_per_sec': ticks / update_s if update_s else 0.0,
+            'end_enemies': len(game.sim.enemies),
+        }
+        for phase in BENCH_PHASES:
+            results[name][phase] = summarize_times(times[phase])
+
+    return {
+        'meta': {'python': sys.version.split()[0], 'pygame': pygame.version.ver, 'numpy': use_numpy and np is not None,
+                 'scheduled_hits': scheduled_hits},
+        'scenarios': results,
+    }
 
-            pygame.display.flip()
-            self.clock.tick(FPS)
+def compare_benchmarks(report, baseline, tolerance=0.10):
+    """Prints a per-scenario comparison and returns the list of regressions."""
+    regressions = []
+    for name, cur in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            print(f"{name:18} (no baseline)")
+            continue
+        rows = [('ticks/s', base['ticks_per_sec'], cur['ticks_per_sec'], True)]
+        for phase in BENCH_PHASES:
+            rows.append((f"{phase} p95", base[phase]['p95'], cur[phase]['p95'], False))
+        for label, old, new, higher_is_better in rows:
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  REGRESSION'
+                regressions.append((name, label, old, new))
+            print(f"{name:18} {label:20} {old:10.3f} -> {new:10.3f} ({change:+.1%}){flag}")
+    return regressions
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Monochrome Tower Defense")
+    parser.add_argument('--headless', action='store_true', help="run all levels without a window and print results")
+    parser.add_argument('--numpy', action='store_true', help="use the NumPy enemy and projectile stores")
+    parser.add_argument('--scheduled-hits', action='store_true', help="resolve shots on a precomputed impact tick instead of flying them (headless, sweeps, benchmarks)")
+    parser.add_argument('--endless', action='store_true', help="with --headless, stream waves until the builder loses")
+    parser.add_argument('--check-wakes', action='store_true', help="play seeded games with the tower wake queue and with per-tick polling side by side and check they match")
+    parser.add_argument('--replay', metavar='FILE', help="re-run a saved replay headless and verify its state hash")
+    parser.add_argument('--sweep', nargs='?', const='', metavar='SPEC', help="run a balance sweep from a JSON spec (built-in demo spec if omitted)")
+    parser.add_argument('--sweep-out', metavar='FILE', help="write the sweep table as JSON")
+    parser.add_argument('--workers', type=int, help="worker processes for --sweep (default: all cores)")
+    parser.add_argument('--bench', nargs='*', metavar='SCENARIO', help="run benchmark scenarios (all if none given)")
+    parser.add_argument('--bench-out', metavar='FILE', help="write the benchmark report as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare the benchmark report against a saved one")
+    parser.add_argument('--fps', type=int, metavar='N', help=f"render frame cap, up to {RENDER_FPS_CAP}. Default: the display's refresh rate where pygame reports it (pygame-ce); "
+                        f"otherwise vsync paces frames under a {RENDER_FPS_CAP} cap, or {FPS} if vsync is unavailable (e.g. headless drivers)")
+    parser.add_argument('--startup-report', nargs='?', const='', metavar='FILE', help="open the game, print startup timings once the menu is up and exit (appends a JSON line to FILE)")
+    args = parser.parse_args()
+    if args.fps is not None and not 1 <= args.fps <= RENDER_FPS_CAP:
+        parser.error(f"--fps must be between 1 and {RENDER_FPS_CAP}")
+
+    if args.bench is not None:
+        unknown = [name for name in args.bench if name not in BENCH_SCENARIOS]
+        if unknown:
+            parser.error(f"unknown benchmark scenario(s): {', '.join(unknown)} (choose from {', '.join(BENCH_SCENARIOS)})")
+        report = run_benchmarks(args.bench, use_numpy=args.numpy, scheduled_hits=args.scheduled_hits)
+        if args.bench_out:
+            with open(args.bench_out, 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_benchmarks(report, json.load(f))
+            if regressions:
+                sys.exit(1)
+    elif args.sweep is not None:
+        spec = SWEEP_DEFAULT_SPEC
+        if args.sweep:
+            with open(args.sweep) as f:
+                spec = json.load(f)
+        rows = run_sweep(spec, workers=args.workers, use_numpy=args.numpy, scheduled_hits=args.scheduled_hits)
+        print_sweep_table(rows)
+        if args.sweep_out:
+            with open(args.sweep_out, 'w') as f:
+                json.dump(rows, f, indent=2)
+    elif args.check_wakes:
+        sys.exit(0 if check_wake_parity(use_numpy=args.numpy) else 1)
+    elif args.replay:
+        sys.exit(0 if run_replay(args.replay, use_numpy=args.numpy) else 1)
+    elif args.headless:
+        run_headless(use_numpy=args.numpy, scheduled_hits=args.scheduled_hits, endless=args.endless)
+    else:
+        game = Game()
+        game.exit_after_startup = args.startup_report is not None
+        game.render_fps = args.fps
+        report = game.run()
+        if report:
+            print_startup_report(report, args.startup_report)
+            pygame.quit()
\ No newline at end of file